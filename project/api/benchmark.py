@@ -0,0 +1,346 @@
+"""
+Offline benchmarks for the forecast path and the HTTP API.
+
+Runs entirely in-process: the app is driven through httpx's ASGI transport
+and Supabase is replaced by :class:`FakeSupabase`, which records inserts
+instead of sending them.  The model ladder is scored on a holdout of
+synthetic daily series, giving the accuracy each cheaper model trades for
+its fit time.  Results are printed (or written with --output) as JSON, and
+--baseline compares them with an earlier run.
+
+Usage:
+    python benchmark.py [--output results.json] [--requests 500] [--concurrency 16]
+    python benchmark.py --output new.json --baseline old.json [--threshold 0.25]
+
+The exit status is 1 when a latency, memory or holdout error figure
+regressed by more than --threshold relative to the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# Keep fitted models from earlier runs out of the measurements
+os.environ.setdefault("MODEL_REGISTRY_DIR", tempfile.mkdtemp(prefix="ecotrack-benchmark-"))
+
+HISTORICAL_DAYS = [7, 14, 21]
+HORIZONS = [7, 30, 365]
+BATCH_SIZE = 20
+
+# Holdout series per (history length, horizon) for the model ladder
+LADDER_SERIES = 10
+LADDER_LENGTHS = [7, 14, 21, 90]
+LADDER_HORIZONS = [7, 30]
+
+# Keys compared against a baseline; higher is worse for all of them
+COMPARED_METRICS = ("p50_ms", "p95_ms", "p99_ms", "mean_peak_kib", "mape_pct")
+
+
+class FakeSupabase:
+    """Stand-in for the Supabase client that records inserted rows."""
+
+    def __init__(self):
+        self.inserts = {}
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+
+class _FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.rows = []
+
+    def insert(self, rows):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self):
+        self.client.inserts.setdefault(self.table, []).extend(self.rows)
+        return self
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds for a list of durations in seconds."""
+    ms = np.asarray(samples, dtype=float) * 1000
+    if not len(ms):
+        return {"n": 0}
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def forecast_benchmarks(repeat):
+    """Direct fits versus forecast table hits for each historical_days/horizon pair."""
+    from forecast_engine import BASE_HISTORICAL_VALUES, ForecastEngine, fit_forecast, fit_forecast_batch, warm_up
+
+    # Keep one-off import and compilation costs out of the first sample
+    warm_up()
+    base = np.asarray(BASE_HISTORICAL_VALUES, dtype=float)
+    table = ForecastEngine()
+    results = {}
+    for historical_days in HISTORICAL_DAYS:
+        for horizon in HORIZONS:
+            name = f"hd={historical_days},h={horizon}"
+            results[f"fit/{name}"] = time_calls(lambda: fit_forecast(base[:historical_days] * 2.5, horizon), repeat)
+            table.forecast(historical_days, horizon, 1.0)
+            results[f"table/{name}"] = time_calls(lambda: table.forecast(historical_days, horizon, 2.5), repeat * 100)
+
+    rng = np.random.default_rng(0)
+    series = {i: base * rng.uniform(0.5, 2.0) for i in range(BATCH_SIZE)}
+    horizons = {i: 30 for i in series}
+    results[f"batch/{BATCH_SIZE}x30"] = time_calls(lambda: fit_forecast_batch(series, horizons, 1), repeat)
+    return results
+
+
+def holdout_series(count, length, seed=0):
+    """Daily consumption-like series: level, trend, weekly pattern and noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(length)
+    series = []
+    for _ in range(count):
+        weekly = rng.uniform(0.05, 0.2) * np.sin(2 * np.pi * (t + rng.integers(7)) / 7)
+        trend = rng.uniform(-0.002, 0.004) * t
+        noise = rng.normal(0, rng.uniform(0.02, 0.08), length)
+        series.append(rng.uniform(50, 500) * (1 + weekly + trend + noise))
+    return series
+
+
+def ladder_benchmarks(count=LADDER_SERIES):
+    """Holdout error and fit time of each ladder model it is adequate for."""
+    from forecast_engine import LADDER, MIN_LENGTHS, fit_forecast
+
+    results = {}
+    for length in LADDER_LENGTHS:
+        for horizon in LADDER_HORIZONS:
+            series = holdout_series(count, length + horizon, seed=length * 1000 + horizon)
+            for model in LADDER:
+                if length < MIN_LENGTHS[model]:
+                    continue
+                errors, samples = [], []
+                for values in series:
+                    started = time.perf_counter()
+                    forecast = fit_forecast(values[:length], horizon, model)
+                    samples.append(time.perf_counter() - started)
+                    actual = values[length:]
+                    errors.append(np.mean(np.abs(forecast - actual) / actual) * 100)
+                results[f"{model}/n={length},h={horizon}"] = {"mape_pct": float(np.mean(errors)), **summarize(samples)}
+    return results
+
+
+def predict_payloads(count, seed=0):
+    rng = random.Random(seed)
+    appliances = ["lightbulbs", "tvs", "computers", "fans", "refrigerators", "washingMachines"]
+    start = datetime(2024, 1, 1)
+    payloads = []
+    for _ in range(count):
+        # Any range of 2 days or more succeeds; only 1-day ranges, which
+        # leave no historical days, answer 400
+        days = rng.choice([14, 30, 42, 90, 365])
+        payloads.append({
+            "appliances": {name: rng.randint(1, 5) for name in rng.sample(appliances, 3)},
+            "start_date": start.strftime("%Y-%m-%d"),
+            "end_date": (start + timedelta(days=days - 1)).strftime("%Y-%m-%d"),
+        })
+    return payloads
+
+
+def device_payloads(count, devices=100, seed=0):
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    return [{
+        "temperature": rng.uniform(18, 26),
+        "humidity": rng.uniform(30, 60),
+        "voltage": rng.uniform(228, 232),
+        "current": rng.uniform(0.1, 5),
+        "power": rng.uniform(20, 1100),
+        "energy": i * 0.01,
+        "timestamp": str(int(started) + i),
+        "device_id": f"bench-{i % devices}",
+    } for i in range(count)]
+
+
+async def load(client, path, payloads, requests, concurrency):
+    """POST ``requests`` payloads with ``concurrency`` concurrent clients."""
+    latencies = []
+    statuses = {}
+    pending = iter(range(requests))
+
+    async def worker():
+        for i in pending:
+            started = time.perf_counter()
+            response = await client.post(path, json=payloads[i % len(payloads)])
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "throughput_rps": requests / elapsed,
+        "errors": requests - statuses.get(200, 0),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        **summarize(latencies),
+    }
+
+
+async def memory_profile(client, path, payloads, requests):
+    """Python heap allocated per request, measured sequentially with tracemalloc.
+
+    Only allocations in this process are seen; fits inside pool workers are not.
+    """
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    peaks = []
+    for i in range(requests):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await client.post(path, json=payloads[i % len(payloads)])
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return {
+        "requests": requests,
+        "mean_peak_kib": float(np.mean(peaks)) / 1024,
+        "max_peak_kib": float(np.max(peaks)) / 1024,
+        "retained_kib_per_request": retained / requests / 1024,
+    }
+
+
+async def http_benchmarks(requests, concurrency):
+    import httpx
+
+    import main
+
+    supabase = FakeSupabase()
+    main.create_supabase = lambda: supabase
+    predict = predict_payloads(200)
+    readings = device_payloads(requests)
+
+    results = {}
+    async with main.lifespan(main.app):
+        await main.report.wait()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            # One pass over the payloads so every table entry is warm
+            await load(client, "/predict", predict, len(predict), concurrency)
+            results["load"] = {
+                "predict": await load(client, "/predict", predict, requests, concurrency),
+                "device_data": await load(client, "/device-data", readings, requests, concurrency),
+            }
+            results["memory"] = {
+                "predict": await memory_profile(client, "/predict", predict, min(requests, 200)),
+                "device_data": await memory_profile(client, "/device-data", readings, min(requests, 200)),
+            }
+        results["startup"] = main.report.stats()
+    # Leaving the lifespan flushes the ingestion queue into the fake client
+    results["recorded_inserts"] = {table: len(rows) for table, rows in supabase.inserts.items()}
+    return results
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif key in COMPARED_METRICS:
+            flat[path] = value
+    return flat
+
+
+def compare(baseline, results, threshold):
+    """Metrics more than ``threshold`` (relative) worse than in ``baseline``."""
+    before = flatten(baseline)
+    regressions = []
+    for path, value in flatten(results).items():
+        previous = before.get(path)
+        if previous and value > previous * (1 + threshold):
+            regressions.append({"metric": path, "baseline": previous, "current": value,
+                                "change": value / previous - 1})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(requests=500, concurrency=16, repeat=5, forecast=True, http=True):
+    from forecast_executor import FORECAST_WORKERS
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "forecast_workers": FORECAST_WORKERS,
+        }
+    }
+    if forecast:
+        results["forecast"] = forecast_benchmarks(repeat)
+        results["ladder"] = ladder_benchmarks()
+    if http:
+        results["http"] = asyncio.run(http_benchmarks(requests, concurrency))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the forecast path and the API in-process.")
+    parser.add_argument("--requests", type=int, default=500, help="requests per load-test endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent load-test clients")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per forecast microbenchmark")
+    parser.add_argument("--skip-forecast", dest="forecast", action="store_false", help="skip microbenchmarks")
+    parser.add_argument("--skip-http", dest="http", action="store_false", help="skip the API load test")
+    parser.add_argument("--output", help="write results to this file instead of stdout")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.concurrency, args.repeat, args.forecast, args.http)
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(json.load(f), results, args.threshold)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    for regression in results.get("regressions", []):
+        print(f"REGRESSION {regression['metric']}: {regression['baseline']:.3f} -> "
+              f"{regression['current']:.3f} ({regression['change']:+.0%})", file=sys.stderr)
+    sys.exit(1 if results.get("regressions") else 0)
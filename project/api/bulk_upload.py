@@ -0,0 +1,144 @@
+"""
+Streaming bulk upload of historical device readings.
+
+The request body (NDJSON or CSV) is split into lines as it arrives and
+processed ``UPLOAD_CHUNK_ROWS`` rows at a time, so memory stays constant
+regardless of file size.  Each chunk is validated with vectorized pandas
+operations and written through the SQLAlchemy engine, using ``COPY`` on
+Postgres and multi-row inserts elsewhere.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+
+from sqlalchemy import insert
+
+from ingestion import normalize_timestamps
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "50000"))
+
+NUMERIC_COLUMNS = ["temperature", "humidity", "voltage", "current", "power", "energy"]
+COLUMNS = NUMERIC_COLUMNS + ["timestamp", "device_id"]
+
+
+async def iter_line_chunks(stream, chunk_rows=UPLOAD_CHUNK_ROWS):
+    """Yield lists of at most ``chunk_rows`` non-empty lines from a byte stream."""
+    remainder = b""
+    lines = []
+    async for data in stream:
+        *complete, remainder = (remainder + data).split(b"\n")
+        lines.extend(line for line in complete if line.strip())
+        while len(lines) >= chunk_rows:
+            yield lines[:chunk_rows]
+            lines = lines[chunk_rows:]
+    if remainder.strip():
+        lines.append(remainder)
+    if lines:
+        yield lines
+
+
+def parse_ndjson(lines):
+    import pandas as pd
+
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return pd.DataFrame.from_records(records, columns=COLUMNS)
+
+
+def parse_csv(header, lines):
+    import pandas as pd
+
+    text = b"\n".join([header, *lines]).decode("utf-8", errors="replace")
+    df = pd.read_csv(io.StringIO(text), dtype=str, on_bad_lines="skip")
+    return df.reindex(columns=COLUMNS)
+
+
+def validate(df):
+    """Coerce a parsed chunk to the device_data schema and drop invalid rows."""
+    import pandas as pd
+
+    df = df.copy()
+    for column in NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    df["timestamp"] = normalize_timestamps(df["timestamp"])
+    df["device_id"] = df["device_id"].fillna("default").astype(str)
+    valid = df[NUMERIC_COLUMNS].notna().all(axis=1) & df["timestamp"].notna()
+    return df[valid]
+
+
+def write_chunk(df):
+    from database import engine
+    from models import DeviceReading
+
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        buffer = io.StringIO()
+        df.to_csv(buffer, columns=COLUMNS, index=False, header=False)
+        buffer.seek(0)
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY device_data ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+            raw.commit()
+        finally:
+            raw.close()
+    else:
+        with engine.begin() as conn:
+            conn.execute(insert(DeviceReading.__table__), df[COLUMNS].to_dict("records"))
+
+
+def process_chunk(lines, fmt, header=None):
+    df = parse_csv(header, lines) if fmt == "csv" else parse_ndjson(lines)
+    df = validate(df)
+    if len(df):
+        write_chunk(df)
+    return len(df)
+
+
+async def upload(stream, fmt):
+    """Load an NDJSON or CSV byte stream into device_data chunk by chunk.
+
+    Chunks are committed one at a time, so if one fails the upload stops
+    with ``status`` "failed" and reports the chunks already written; the
+    client can resend the rest of the file.
+    """
+    chunks = []
+    header = None
+    summary = {"status": "success"}
+    try:
+        async for lines in iter_line_chunks(stream):
+            if fmt == "csv" and header is None:
+                header, lines = lines[0], lines[1:]
+                if not lines:
+                    continue
+            # Parsing and the database write are blocking; keep them off the event loop
+            written = await asyncio.to_thread(process_chunk, lines, fmt, header)
+            chunks.append({
+                "chunk": len(chunks),
+                "rows": len(lines),
+                "written": written,
+                "rejected": len(lines) - written,
+            })
+    except Exception as e:
+        logger.exception("Bulk upload failed at chunk %d", len(chunks))
+        summary = {"status": "failed", "failed_chunk": len(chunks), "error": str(e)}
+    rows = sum(chunk["rows"] for chunk in chunks)
+    written = sum(chunk["written"] for chunk in chunks)
+    return {
+        **summary,
+        "rows": rows,
+        "written": written,
+        "rejected": rows - written,
+        "chunks": chunks,
+    }
@@ -0,0 +1,176 @@
+"""
+Incremental daily forecasts from real device_data history.
+
+A device's ``energy`` readings are a running counter, so daily consumption
+is the increase of the counter's end-of-day value (falling back to the span
+within the day on the first day and after counter resets).  Per device we
+keep the daily counter bounds, the fitted model and responses by horizon.
+The database is only re-checked once the cached state is older than
+``DEVICE_FORECAST_MAX_AGE`` seconds or the UTC day rolls over.  On a
+re-check only days from the last stored one onwards are fetched, and the
+model is only refitted when the set of complete days changed.  State is
+kept for the ``DEVICE_FORECAST_MAX_DEVICES`` most recently requested devices.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+import device_series
+from encoding import DateRange
+from forecast_engine import MODEL_SPEC, fit_model, predict_model
+from model_registry import registry
+
+DEVICE_FORECAST_MAX_AGE = float(os.getenv("DEVICE_FORECAST_MAX_AGE", "3600"))
+DEVICE_FORECAST_MIN_DAYS = int(os.getenv("DEVICE_FORECAST_MIN_DAYS", "7"))
+DEVICE_FORECAST_MAX_HORIZON = int(os.getenv("DEVICE_FORECAST_MAX_HORIZON", "90"))
+DEVICE_FORECAST_MAX_DEVICES = int(os.getenv("DEVICE_FORECAST_MAX_DEVICES", "10000"))
+
+
+class InsufficientHistory(Exception):
+    """The device has fewer than ``DEVICE_FORECAST_MIN_DAYS`` complete days."""
+
+
+def daily_totals(daily):
+    """Energy used per day from per-day bounds of the running counter."""
+    end_of_day = daily["max_energy"].to_numpy(dtype=float)
+    within_day = end_of_day - daily["min_energy"].to_numpy(dtype=float)
+    totals = np.diff(end_of_day, prepend=np.nan)
+    # The first day and counter resets only have the span within the day
+    return np.where(np.isnan(totals) | (totals < 0), within_day, totals)
+
+
+def fit_device_model(key, totals):
+    # Runs in a forecast pool worker
+    return registry.get_or_fit(key, totals, fit_model, MODEL_SPEC)
+
+
+class DeviceState:
+    __slots__ = ("daily", "model", "responses", "checked_at", "day", "last_complete_day")
+
+    def __init__(self):
+        self.daily = None
+        self.model = None
+        self.responses = {}
+        self.checked_at = 0.0
+        self.day = None
+        self.last_complete_day = None
+
+    def fresh(self, max_age, now, today):
+        return self.model is not None and self.day == today and now - self.checked_at < max_age
+
+
+class DeviceForecaster:
+    def __init__(self, executor, max_age=DEVICE_FORECAST_MAX_AGE, max_devices=DEVICE_FORECAST_MAX_DEVICES):
+        self.executor = executor
+        self.max_age = max_age
+        self.max_devices = max_devices
+        self.hits = 0
+        self.refreshes = 0
+        self.refits = 0
+        self.evictions = 0
+        # Least recently requested first
+        self._states = OrderedDict()
+        self._locks = {}
+
+    async def forecast(self, device_id, horizon, max_age=None):
+        import pandas as pd
+
+        max_age = self.max_age if max_age is None else max_age
+        now = time.time()
+        today = pd.Timestamp.now("UTC").tz_convert(None).normalize()
+
+        state = self._states.get(device_id)
+        if state is not None:
+            self._states.move_to_end(device_id)
+            if state.fresh(max_age, now, today) and horizon in state.responses:
+                self.hits += 1
+                return {**state.responses[horizon], "cached": True}
+
+        async with self._locks.setdefault(device_id, asyncio.Lock()):
+            state = self._states.get(device_id)
+            if state is None:
+                state = self._states[device_id] = DeviceState()
+                self._evict()
+            if not state.fresh(max_age, now, today):
+                await self._refresh(device_id, state, now, today)
+            if horizon not in state.responses:
+                predictions = await run_in_threadpool(predict_model, state.model.model, horizon)
+                state.responses[horizon] = self._response(device_id, state, horizon, predictions)
+        return {**state.responses[horizon], "cached": False}
+
+    async def _refresh(self, device_id, state, now, today):
+        import pandas as pd
+
+        self.refreshes += 1
+        # Re-read the last stored day too: it may have been incomplete
+        start = state.daily.index[-1] if state.daily is not None and len(state.daily) else None
+        fetched = await run_in_threadpool(
+            device_series.daily_energy, device_id, start.strftime("%Y-%m-%d") if start is not None else None
+        )
+        if start is not None:
+            fetched = pd.concat([state.daily[state.daily.index < start], fetched])
+        state.daily = fetched
+        state.checked_at = now
+        state.day = today
+
+        complete = fetched[fetched.index < today]
+        if len(complete) < DEVICE_FORECAST_MIN_DAYS:
+            raise InsufficientHistory(
+                f"Device {device_id} has {len(complete)} complete days of readings; "
+                f"at least {DEVICE_FORECAST_MIN_DAYS} are needed"
+            )
+        # Fill days without readings so the series stays regular
+        complete = complete.reindex(pd.date_range(complete.index[0], complete.index[-1], freq="D")).ffill()
+        totals = daily_totals(complete)
+
+        key = f"device/{device_id}"
+        # May load and unpickle the model from disk or Postgres
+        model = await run_in_threadpool(registry.lookup, key, totals, MODEL_SPEC)
+        if model is None:
+            model = registry.adopt(await self.executor.run(fit_device_model, key, totals))
+            self.refits += 1
+        if model is not state.model:
+            state.model = model
+            state.responses = {}
+        state.last_complete_day = complete.index[-1]
+
+    def _evict(self):
+        # Devices being refreshed keep their state and lock
+        excess = len(self._states) - self.max_devices
+        victims = []
+        for device_id in self._states:
+            if len(victims) >= excess:
+                break
+            if not self._locks[device_id].locked():
+                victims.append(device_id)
+        for device_id in victims:
+            del self._states[device_id]
+            del self._locks[device_id]
+        self.evictions += len(victims)
+
+    def _response(self, device_id, state, horizon, predictions):
+        import pandas as pd
+
+        start = state.last_complete_day + pd.Timedelta(days=1)
+        return {
+            "device_id": device_id,
+            "horizon": horizon,
+            "last_complete_day": state.last_complete_day.strftime('%Y-%m-%d'),
+            "dates": DateRange(start.date(), horizon),
+            "predictions": predictions,
+            "model": state.model.version_info(),
+        }
+
+    def stats(self):
+        return {
+            "devices": len(self._states),
+            "max_devices": self.max_devices,
+            "evictions": self.evictions,
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "refits": self.refits,
+        }
@@ -0,0 +1,194 @@
+"""
+Downsampled time-series queries over device_data.
+
+Readings are filtered by device and time range in SQL.  Minute, hour and
+day resolutions are aggregated in SQL too, with ``date_trunc`` on Postgres
+and ``strftime`` on SQLite, and the result is reduced to at most
+``points`` samples with Largest-Triangle-Three-Buckets so the response size
+depends on the request, not on how much history the table holds.
+"""
+import os
+
+import numpy as np
+from sqlalchemy import DateTime, cast, func, select
+
+SERIES_MAX_POINTS = int(os.getenv("SERIES_MAX_POINTS", "5000"))
+# Upper bound on rows fetched for resolution=raw before downsampling
+SERIES_MAX_RAW_ROWS = int(os.getenv("SERIES_MAX_RAW_ROWS", "200000"))
+
+RESOLUTIONS = ["raw", "minute", "hour", "day"]
+# SQLite bucket formats; Postgres uses date_trunc with the resolution name
+BUCKET_FORMATS = {"minute": "%Y-%m-%dT%H:%M:00Z", "hour": "%Y-%m-%dT%H:00:00Z", "day": "%Y-%m-%dT00:00:00Z"}
+METRICS = ["power", "voltage", "current", "energy", "temperature", "humidity"]
+
+
+def parse_bound(value):
+    """Normalize a query bound to the ISO form stored in device_data."""
+    import pandas as pd
+
+    if value is None:
+        return None
+    if value.isdigit():
+        ts = pd.Timestamp(int(value), unit="s", tz="UTC")
+    else:
+        ts = pd.Timestamp(value)
+        ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def lttb(x, y, threshold):
+    """Indices of the Largest-Triangle-Three-Buckets downsample of (x, y)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        stop = int((i + 1) * every) + 1
+        next_stop = min(int((i + 2) * every) + 1, n)
+        avg_x = x[stop:next_stop].mean()
+        avg_y = y[stop:next_stop].mean()
+        # Pick the point forming the largest triangle with the previous pick
+        # and the average of the next bucket
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def _filters(DeviceReading, device_id, start, end, since, inclusive_since):
+    conditions = [DeviceReading.device_id == device_id]
+    # ISO 8601 strings sort chronologically, so the range is an index scan
+    if start is not None:
+        conditions.append(DeviceReading.timestamp >= start)
+    if end is not None:
+        conditions.append(DeviceReading.timestamp <= end)
+    if since is not None:
+        conditions.append(DeviceReading.timestamp >= since if inclusive_since else DeviceReading.timestamp > since)
+    return conditions
+
+
+def _fetch_raw(engine, DeviceReading, conditions):
+    import pandas as pd
+
+    columns = [DeviceReading.timestamp] + [getattr(DeviceReading, m) for m in METRICS]
+    # Newest rows win when the range holds more than the cap
+    stmt = select(*columns).where(*conditions).order_by(DeviceReading.timestamp.desc()).limit(SERIES_MAX_RAW_ROWS)
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).fetchall()
+    df = pd.DataFrame(rows[::-1], columns=["timestamp"] + METRICS)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, format="ISO8601")
+    return df
+
+
+def _bucket(engine, column, resolution):
+    """SQL expression truncating an ISO timestamp column to a UTC bucket."""
+    if engine.dialect.name == "postgresql":
+        return func.date_trunc(resolution, cast(column, DateTime(timezone=True)))
+    # SQLite: strftime() parses the stored ISO strings, offsets included
+    return func.strftime(BUCKET_FORMATS[resolution], column)
+
+
+def _fetch_aggregated(engine, DeviceReading, conditions, resolution):
+    import pandas as pd
+
+    bucket = _bucket(engine, DeviceReading.timestamp, resolution).label("timestamp")
+    columns = [
+        # energy is a running counter: keep its highest reading in each bucket
+        func.max(DeviceReading.energy).label(m) if m == "energy" else func.avg(getattr(DeviceReading, m)).label(m)
+        for m in METRICS
+    ]
+    stmt = select(bucket, *columns).where(*conditions).group_by(bucket).order_by(bucket)
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).fetchall()
+    df = pd.DataFrame(rows, columns=["timestamp"] + METRICS)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, format="ISO8601")
+    return df
+
+
+def daily_energy_many(device_ids, start=None):
+    """Per-device, per-day minimum and maximum of the energy counter.
+
+    Returns a DataFrame with ``device_id``, ``day`` (UTC), ``min_energy`` and
+    ``max_energy`` columns, sorted by device and day, covering days from
+    ``start`` (a date string) on.
+    """
+    from database import engine
+    from models import DeviceReading
+    import pandas as pd
+
+    conditions = [DeviceReading.device_id.in_(device_ids)]
+    if start is not None:
+        conditions.append(DeviceReading.timestamp >= parse_bound(start))
+    day = _bucket(engine, DeviceReading.timestamp, "day").label("day")
+    stmt = (
+        select(DeviceReading.device_id, day, func.min(DeviceReading.energy), func.max(DeviceReading.energy))
+        .where(*conditions)
+        .group_by(DeviceReading.device_id, day)
+        .order_by(DeviceReading.device_id, day)
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).fetchall()
+    daily = pd.DataFrame(rows, columns=["device_id", "day", "min_energy", "max_energy"])
+    daily["day"] = pd.to_datetime(daily["day"], utc=True, format="ISO8601").dt.tz_convert(None)
+    return daily.sort_values(["device_id", "day"], ignore_index=True)
+
+
+def daily_energy(device_id, start=None):
+    """Per-day energy counter bounds for one device, indexed by UTC day."""
+    daily = daily_energy_many([device_id], start)
+    return daily.drop(columns="device_id").set_index("day")
+
+
+def device_ids_after(after=None, limit=1000):
+    """Up to ``limit`` distinct device ids greater than ``after``, in order."""
+    from database import engine
+    from models import DeviceReading
+
+    stmt = select(DeviceReading.device_id).distinct().order_by(DeviceReading.device_id).limit(limit)
+    if after is not None:
+        stmt = stmt.where(DeviceReading.device_id > after)
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(stmt)]
+
+
+def query_series(device_id, start=None, end=None, resolution="hour", points=1000, since=None, metric="power"):
+    """Series for one device as NumPy columns plus a ``next_since`` cursor.
+
+    With ``since``, raw queries return readings strictly after the cursor;
+    aggregated queries include the cursor's bucket so a partially filled
+    last bucket is refreshed.
+    """
+    from database import engine
+    from models import DeviceReading
+
+    aggregated = resolution != "raw"
+    conditions = _filters(DeviceReading, device_id, parse_bound(start), parse_bound(end),
+                          parse_bound(since), inclusive_since=aggregated)
+    if aggregated:
+        df = _fetch_aggregated(engine, DeviceReading, conditions, resolution)
+    else:
+        df = _fetch_raw(engine, DeviceReading, conditions)
+
+    if len(df) > points:
+        x = df["timestamp"].to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+        y = np.nan_to_num(df[metric].to_numpy(dtype=float))
+        df = df.iloc[lttb(x, y, points)]
+
+    # NumPy columns; encoding.respond() turns them into the requested format
+    timestamps = df["timestamp"].dt.tz_convert(None).to_numpy(dtype="datetime64[s]")
+    series = {
+        "device_id": device_id,
+        "resolution": resolution,
+        "points": len(df),
+        "timestamps": timestamps,
+        "next_since": f"{timestamps[-1]}Z" if len(timestamps) else since,
+    }
+    for m in METRICS:
+        series[m] = df[m].to_numpy(dtype=float)
+    return series
@@ -0,0 +1,139 @@
+"""
+Negotiated response encodings for forecast and series payloads.
+
+Handlers build payloads from NumPy arrays, :class:`DateRange` objects and
+``datetime64`` timestamp arrays, and :func:`respond` encodes them in the
+format picked by :func:`negotiate`:
+
+``json``
+    The documented response shape, encoded by orjson straight from the
+    NumPy buffers.  This is the default.
+``columnar`` (``application/vnd.ecotrack.columnar+json``)
+    Date ranges are sent as ``{"start", "freq", "periods"}``, timestamps as
+    epoch seconds and float arrays as float32.
+``arrow`` (``application/vnd.apache.arrow.stream``)
+    An Arrow IPC stream with one row per date or timestamp and float32
+    values.  The remaining scalar fields are JSON-encoded in the schema
+    metadata.  Needs pyarrow.
+
+The ``format`` query parameter takes precedence over the ``Accept`` header.
+"""
+import importlib.util
+
+import numpy as np
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+JSON = "json"
+COLUMNAR = "columnar"
+ARROW = "arrow"
+
+MEDIA_TYPES = {
+    JSON: "application/json",
+    COLUMNAR: "application/vnd.ecotrack.columnar+json",
+    ARROW: "application/vnd.apache.arrow.stream",
+}
+
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+
+class NotAcceptable(Exception):
+    """The requested format is unknown or cannot be produced here."""
+
+
+class ORJSONResponse(JSONResponse):
+    """Default response class: orjson, with NumPy arrays encoded natively."""
+
+    def render(self, content):
+        return orjson.dumps(content, option=_OPTIONS)
+
+
+class DateRange:
+    """``periods`` consecutive dates from ``start``, sent compactly when possible."""
+
+    __slots__ = ("start", "periods", "freq")
+
+    def __init__(self, start, periods, freq="D"):
+        self.start = np.datetime64(start, freq)
+        self.periods = periods
+        self.freq = freq
+
+    def values(self):
+        return self.start + np.arange(self.periods)
+
+    def strings(self):
+        return np.datetime_as_string(self.values()).tolist()
+
+    def columnar(self):
+        return {"start": str(self.start), "freq": self.freq, "periods": self.periods}
+
+
+def negotiate(accept, format=None):
+    """Pick a format from the ``format`` parameter or the ``Accept`` header."""
+    if format is None:
+        format = next((f for f in (ARROW, COLUMNAR) if MEDIA_TYPES[f] in (accept or "")), JSON)
+    if format not in MEDIA_TYPES:
+        raise NotAcceptable(f"Format must be one of {', '.join(MEDIA_TYPES)}")
+    if format == ARROW and not ARROW_AVAILABLE:
+        raise NotAcceptable("Arrow responses need pyarrow, which is not installed")
+    return format
+
+
+def _timestamps(values):
+    # Matches the "%Y-%m-%dT%H:%M:%SZ" strings of the JSON format
+    return [ts + "Z" for ts in np.datetime_as_string(values, unit="s").tolist()]
+
+
+def _json_value(value, fmt):
+    if isinstance(value, DateRange):
+        return value.columnar() if fmt == COLUMNAR else value.strings()
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == "M":
+            return value.astype("datetime64[s]").astype(np.int64) if fmt == COLUMNAR else _timestamps(value)
+        if fmt == COLUMNAR and value.dtype.kind == "f":
+            return value.astype(np.float32)
+    return value
+
+
+def _arrow(payload, table):
+    import pyarrow as pa
+
+    columns = {}
+    for name, values in table.items():
+        if isinstance(values, DateRange):
+            values = values.values()
+        if values.dtype.kind == "f":
+            values = values.astype(np.float32)
+        elif values.dtype.kind == "M":
+            values = pa.array(values.astype("datetime64[s]"), type=pa.timestamp("s", tz="UTC"))
+        columns[name] = values
+    metadata = {
+        name: orjson.dumps(_json_value(value, COLUMNAR), option=_OPTIONS)
+        for name, value in payload.items()
+        if not isinstance(value, (np.ndarray, DateRange))
+    }
+    batch = pa.record_batch(list(columns.values()), names=list(columns)).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def fields(payload, fmt=JSON):
+    """``payload`` with its dates and arrays in the shape of ``fmt``, for orjson."""
+    return {name: _json_value(value, fmt) for name, value in payload.items()}
+
+
+def respond(fmt, payload, table=None):
+    """Encode ``payload`` as ``fmt``.
+
+    ``table(payload)`` returns the Arrow columns, a dict of equal-length
+    arrays or :class:`DateRange` objects.  It is only called for ``arrow``.
+    """
+    if fmt == ARROW:
+        body = _arrow(payload, table(payload))
+    else:
+        body = orjson.dumps(fields(payload, fmt), option=_OPTIONS)
+    return Response(content=body, media_type=MEDIA_TYPES[fmt])
@@ -0,0 +1,188 @@
+"""
+Fleet-wide device forecasts written to the forecasts table.
+
+Devices are processed in chunks of ``FLEET_CHUNK_SIZE`` in device_id order.
+Each chunk's daily history is read with one query, forecast with a single
+multi-series StatsForecast call across all cores, and bulk-inserted in one
+transaction, so memory is bounded by the chunk size.  Because chunks commit
+in device_id order, a rerun on the same day resumes after the largest
+device_id that already has a forecast from today.
+
+Usage:
+    python fleet_forecast.py [--horizon 7] [--chunk-size 5000] [--no-resume]
+
+Set ``FLEET_FORECAST_AT=HH:MM`` (UTC) to also run it daily from the API
+process, in a spawned child process.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import func, insert, select
+
+import device_series
+from device_forecast import DEVICE_FORECAST_MIN_DAYS
+from forecast_engine import build_model
+
+logger = logging.getLogger(__name__)
+
+FLEET_CHUNK_SIZE = int(os.getenv("FLEET_CHUNK_SIZE", "5000"))
+FLEET_HORIZON = int(os.getenv("FLEET_HORIZON", "7"))
+FLEET_N_JOBS = int(os.getenv("FLEET_N_JOBS", "-1"))
+FLEET_FORECAST_AT = os.getenv("FLEET_FORECAST_AT")
+
+# Same bands as the trend labels shown by the frontend
+TREND_THRESHOLD = 2.0
+
+
+def daily_totals_many(daily):
+    """Vectorized device_forecast.daily_totals over a multi-device frame."""
+    increase = daily.groupby("device_id")["max_energy"].diff()
+    within_day = daily["max_energy"] - daily["min_energy"]
+    return within_day.where(increase.isna() | (increase < 0), increase)
+
+
+def fill_days(daily):
+    """Reindex every device to consecutive days, forward-filling the gaps.
+
+    The fleet-wide counterpart of the fill in ``DeviceForecaster._refresh``.
+    """
+    import pandas as pd
+
+    bounds = daily.groupby("device_id", sort=False)["day"].agg(["min", "max"])
+    lengths = ((bounds["max"] - bounds["min"]).dt.days + 1).to_numpy()
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    index = pd.MultiIndex.from_arrays([
+        np.repeat(bounds.index.to_numpy(), lengths),
+        np.repeat(bounds["min"].to_numpy(), lengths) + offsets * np.timedelta64(1, "D"),
+    ], names=["device_id", "day"])
+    filled = daily.set_index(["device_id", "day"]).reindex(index)
+    return filled.groupby(level="device_id", sort=False).ffill().reset_index()
+
+
+def forecast_chunk(daily, today, horizon, n_jobs=FLEET_N_JOBS):
+    """Forecast every device in ``daily`` and summarize it as forecasts rows."""
+    from statsforecast import StatsForecast
+    from statsforecast.models import SeasonalNaive
+    import pandas as pd
+
+    daily = daily[daily["day"] < today]
+    daily = daily[daily.groupby("device_id")["day"].transform("size") >= DEVICE_FORECAST_MIN_DAYS]
+    if daily.empty:
+        return pd.DataFrame(columns=["device_id", "consumption", "trend", "percentage_change"])
+    # Days without readings would otherwise shift the weekly season
+    daily = fill_days(daily)
+    daily["y"] = daily_totals_many(daily)
+
+    df = daily.rename(columns={"device_id": "unique_id", "day": "ds"})[["unique_id", "ds", "y"]]
+    sf = StatsForecast(
+        models=[build_model()],
+        freq="D",
+        n_jobs=n_jobs,
+        fallback_model=SeasonalNaive(season_length=7)
+    )
+    forecast = sf.forecast(df=df, h=horizon)
+    if "unique_id" not in forecast.columns:
+        forecast = forecast.reset_index()
+    column = forecast.filter(like="MSTL").columns[0]
+
+    predicted = forecast.groupby("unique_id")[column].sum()
+    recent = df.groupby("unique_id").tail(horizon).groupby("unique_id")["y"].sum().reindex(predicted.index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(recent > 0, (predicted - recent) / recent * 100, 0.0)
+    trend = np.select([change > TREND_THRESHOLD, change < -TREND_THRESHOLD], ["increase", "decrease"], "stable")
+    return pd.DataFrame({
+        "device_id": predicted.index,
+        "consumption": predicted.to_numpy(),
+        "trend": trend,
+        "percentage_change": change,
+    })
+
+
+def write_forecasts(rows):
+    from database import SessionLocal
+    from models import Forecast
+
+    if rows.empty:
+        return
+    with SessionLocal() as db:
+        db.execute(insert(Forecast), rows.to_dict("records"))
+        db.commit()
+
+
+def last_forecast_device(since):
+    from database import SessionLocal
+    from models import Forecast
+
+    with SessionLocal() as db:
+        return db.execute(
+            select(func.max(Forecast.device_id)).where(Forecast.created_at >= since)
+        ).scalar()
+
+
+def run(horizon=FLEET_HORIZON, chunk_size=FLEET_CHUNK_SIZE, resume=True, n_jobs=FLEET_N_JOBS):
+    import pandas as pd
+
+    started = time.perf_counter()
+    today = pd.Timestamp.now("UTC").tz_convert(None).normalize()
+    after = last_forecast_device(today.to_pydatetime()) if resume else None
+    if after is not None:
+        logger.info("Resuming after device %s", after)
+
+    summary = {"resumed_after": after, "chunks": 0, "devices": 0, "forecasts": 0}
+    while True:
+        device_ids = device_series.device_ids_after(after, chunk_size)
+        if not device_ids:
+            break
+        rows = forecast_chunk(device_series.daily_energy_many(device_ids), today, horizon, n_jobs)
+        write_forecasts(rows)
+        after = device_ids[-1]
+        summary["chunks"] += 1
+        summary["devices"] += len(device_ids)
+        summary["forecasts"] += len(rows)
+        logger.info("Chunk %d: %d devices, %d forecasts, up to device %s",
+                    summary["chunks"], len(device_ids), len(rows), after)
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+async def schedule(at=FLEET_FORECAST_AT):
+    """Run the job every day at ``at`` (HH:MM, UTC) inside the API process."""
+    import pandas as pd
+
+    hour, minute = (int(part) for part in at.split(":"))
+    while True:
+        now = pd.Timestamp.now("UTC")
+        next_run = now.normalize() + pd.Timedelta(hours=hour, minutes=minute)
+        if next_run <= now:
+            next_run += pd.Timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        # Forking StatsForecast workers from a thread of the API process would
+        # copy its locks and event loop, so the job runs in a spawned process
+        pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            summary = await asyncio.get_running_loop().run_in_executor(pool, run)
+            logger.info("Fleet forecast finished: %s", summary)
+        except Exception:
+            logger.exception("Fleet forecast failed")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast every device and store the results in forecasts.")
+    parser.add_argument("--horizon", type=int, default=FLEET_HORIZON, help="days to forecast")
+    parser.add_argument("--chunk-size", type=int, default=FLEET_CHUNK_SIZE, help="devices per chunk")
+    parser.add_argument("--n-jobs", type=int, default=FLEET_N_JOBS, help="StatsForecast processes (-1 for all cores)")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="start from the first device even if today's run was interrupted")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)-5.5s [%(name)s] %(message)s")
+    print(json.dumps(run(args.horizon, args.chunk_size, args.resume, args.n_jobs), indent=2))
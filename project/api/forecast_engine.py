@@ -0,0 +1,342 @@
+"""
+Memoized forecasts for the /predict endpoint.
+
+Every /predict request forecasts a prefix of the static
+``BASE_HISTORICAL_VALUES`` series multiplied by a scale factor, so the only
+inputs that reach the model are ``historical_days`` and the horizon.  The
+engine fits each prefix once at unit scale and answers requests by scaling
+the cached forecast.
+
+Forecasts come from one of the models in ``LADDER``, cheapest first.  Each
+model has its own table (see ``engines``); ``model_ladder.py`` picks the
+model for a request.
+
+statsforecast is imported on first use so the API process can start
+listening before it is loaded (see ``startup.py``).
+"""
+import logging
+import os
+
+import numpy as np
+
+from metrics import span
+from model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Both are read when statsforecast is first imported: statsforecast only
+# compiles its kernels with numba's cache=True when NIXTLA_NUMBA_CACHE is
+# set, and numba writes them to NUMBA_CACHE_DIR.  Kernels are cached next to
+# the app so restarts and pool workers load them instead of recompiling.
+os.environ.setdefault("NIXTLA_NUMBA_CACHE", "1")
+NUMBA_CACHE_DIR = os.environ.setdefault(
+    "NUMBA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".numba_cache")
+)
+
+# Static historical values (21 days)
+BASE_HISTORICAL_VALUES = [
+    100, 105, 102, 108, 106, 110, 105,  # Week 1
+    103, 107, 104, 109, 108, 112, 107,  # Week 2
+    105, 108, 106, 111, 110, 115, 109   # Week 3
+]
+
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "365"))
+FORECAST_TOLERANCE = float(os.getenv("FORECAST_TOLERANCE", "1e-4"))
+FORECAST_PRECOMPUTE = os.getenv("FORECAST_PRECOMPUTE", "1") == "1"
+
+# Scale factors used to check that a cached prefix scales linearly
+VERIFY_SCALES = (0.01, 100.0)
+
+
+# Part of every registry fingerprint; change it whenever build_model changes
+MODEL_SPEC = "MSTL(season_length=[7], trend_forecaster=AutoARIMA()), AutoARIMA() under 7 days"
+
+DEFAULT_MODEL = "mstl"
+
+# Models from cheapest to most accurate, with their registry specs
+LADDER = ("seasonal_naive", "ets", "mstl")
+MODEL_SPECS = {
+    "seasonal_naive": "SeasonalNaive(season_length=7)",
+    "ets": "AutoETS(season_length=7)",
+    "mstl": MODEL_SPEC,
+}
+# Shortest history each model is used for.  MSTL is the default and is
+# tried on any history.  Cheaper models only stand in where they are sound:
+# SeasonalNaive forecasts NaN without a full week, and AutoETS only beats
+# it on the benchmark holdout from three weeks on.
+MIN_LENGTHS = {"seasonal_naive": 7, "ets": 21, "mstl": 1}
+
+
+def build_model(name=DEFAULT_MODEL, length=None):
+    from statsforecast.models import MSTL, AutoARIMA, AutoETS, SeasonalNaive
+
+    if name == "seasonal_naive":
+        return SeasonalNaive(season_length=7)
+    if name == "ets":
+        return AutoETS(season_length=7)
+    # Without a full week MSTL cannot forecast further ahead than the history
+    # is long; its trend forecaster alone can
+    if length is not None and length < 7:
+        return AutoARIMA()
+    # MSTL decomposition with weekly seasonality
+    return MSTL(
+        season_length=[7],
+        trend_forecaster=AutoARIMA()
+    )
+
+
+def _frame(values):
+    import pandas as pd
+
+    dates = pd.date_range(start="2000-01-01", periods=len(values), freq='D')
+    return pd.DataFrame({
+        'unique_id': ['ts1'] * len(values),
+        'ds': dates,
+        'y': values
+    })
+
+
+def _values(forecast):
+    # One model per call, so its forecast is the last column
+    return forecast.iloc[:, -1].to_numpy()
+
+
+def fit_forecast(values, horizon, model=DEFAULT_MODEL):
+    """Fit a fresh ``model`` on ``values`` and forecast ``horizon`` days."""
+    from statsforecast import StatsForecast
+
+    with span("forecast_frame"):
+        df = _frame(values)
+    with span("forecast_fit"):
+        sf = StatsForecast(models=[build_model(model, len(values))], freq='D')
+        forecast = sf.forecast(df=df, h=horizon)
+    return _values(forecast)
+
+
+def fit_model(values, model=DEFAULT_MODEL):
+    """Fit ``model`` on ``values`` for later :func:`predict_model` calls."""
+    from statsforecast import StatsForecast
+
+    with span("forecast_frame"):
+        df = _frame(values)
+    with span("forecast_fit"):
+        sf = StatsForecast(models=[build_model(model, len(values))], freq='D')
+        return sf.fit(df=df)
+
+
+def predict_model(sf, horizon):
+    with span("forecast_predict"):
+        forecast = sf.predict(h=horizon)
+    return _values(forecast)
+
+
+def warm_up():
+    """Fit and forecast once so numba compiles (or loads) every model kernel."""
+    for model in LADDER:
+        fit_forecast(BASE_HISTORICAL_VALUES, 7, model)
+    predict_model(fit_model(BASE_HISTORICAL_VALUES), 7)
+
+
+def fit_forecast_many(series, horizon, n_jobs=-1):
+    """Forecast several series in one StatsForecast call.
+
+    ``series`` maps a unique id to its values.  Returns a dict mapping each
+    id to a ``horizon``-day forecast.
+    """
+    from statsforecast import StatsForecast
+    import pandas as pd
+
+    ids = list(series)
+    with span("forecast_frame"):
+        lengths = [len(series[uid]) for uid in ids]
+        dates = np.concatenate([
+            pd.date_range(start="2000-01-01", periods=length, freq='D').values for length in lengths
+        ])
+        df = pd.DataFrame({
+            'unique_id': np.repeat(ids, lengths),
+            'ds': dates,
+            'y': np.concatenate([np.asarray(series[uid], dtype=float) for uid in ids])
+        })
+    with span("forecast_fit"):
+        sf = StatsForecast(models=[build_model()], freq='D', n_jobs=n_jobs)
+        forecast = sf.forecast(df=df, h=horizon)
+    if 'unique_id' not in forecast.columns:
+        forecast = forecast.reset_index()
+    values = forecast.filter(like='MSTL').iloc[:, 0].to_numpy()
+    groups = forecast.groupby('unique_id', sort=False).indices
+    return {uid: values[groups[uid]] for uid in ids}
+
+
+def fit_forecast_batch(series, horizons, n_jobs=-1):
+    """Forecast each series over its own horizon, isolating failures.
+
+    All series are fitted in one call.  If that call fails, the batch is
+    bisected so a few unfittable series cost O(k log n) calls instead of
+    failing everything.  Returns ``(forecasts, errors)`` keyed by series id.
+    """
+    forecasts, errors = {}, {}
+    ids = list(series)
+    if len(ids) == 1:
+        uid = ids[0]
+        try:
+            forecasts[uid] = fit_forecast(series[uid], horizons[uid])
+        except Exception as e:
+            errors[uid] = str(e)
+        return forecasts, errors
+
+    try:
+        fitted = fit_forecast_many(series, max(horizons.values()), n_jobs=n_jobs)
+        return {uid: fitted[uid][:horizons[uid]] for uid in ids}, errors
+    except Exception:
+        middle = len(ids) // 2
+        for part in (ids[:middle], ids[middle:]):
+            part_forecasts, part_errors = fit_forecast_batch(
+                {uid: series[uid] for uid in part}, {uid: horizons[uid] for uid in part}, n_jobs
+            )
+            forecasts.update(part_forecasts)
+            errors.update(part_errors)
+    return forecasts, errors
+
+
+class ForecastEngine:
+    """Unit-scale forecast table of one model, keyed by ``historical_days``.
+
+    Forecasts are prefix-consistent in the horizon, so a single forecast of
+    ``capacity`` days per prefix answers every shorter horizon.  Longer
+    horizons refit the prefix with at least double the capacity.
+    """
+
+    def __init__(self, base_values=BASE_HISTORICAL_VALUES, horizon=FORECAST_HORIZON,
+                 tolerance=FORECAST_TOLERANCE, model=DEFAULT_MODEL):
+        self.base_values = np.asarray(base_values, dtype=float)
+        self.horizon = horizon
+        self.tolerance = tolerance
+        self.model = model
+        # The default model keeps the registry keys it had before the ladder
+        self.key = "predict/unit" if model == DEFAULT_MODEL else f"predict/unit/{model}"
+        self.hits = 0
+        self.misses = 0
+        self._forecasts = {}
+        self._versions = {}
+        self._verified = set()
+        self._unscalable = set()
+
+    def lookup(self, historical_days, horizon):
+        """Return the cached unit forecast, or ``None`` if it must be fitted."""
+        cached = self._forecasts.get(historical_days)
+        if cached is None or len(cached) < horizon:
+            return None
+        self.hits += 1
+        return cached[:horizon]
+
+    def cached(self, historical_days, horizon):
+        """Whether :meth:`forecast` would be answered without fitting."""
+        cached = self._forecasts.get(historical_days)
+        return cached is not None and len(cached) >= horizon and self.scalable(historical_days)
+
+    def unit_forecast(self, historical_days, horizon):
+        unit = self.lookup(historical_days, horizon)
+        if unit is not None:
+            return unit
+
+        self.misses += 1
+        cached = self._forecasts.get(historical_days)
+        capacity = max(horizon, self.horizon)
+        if cached is not None:
+            capacity = max(capacity, 2 * len(cached))
+        model = registry.get_or_fit(
+            f"{self.key}/{historical_days}", self.base_values[:historical_days],
+            lambda values: fit_model(values, self.model), MODEL_SPECS[self.model]
+        )
+        try:
+            values = predict_model(model.model, capacity)
+        except ValueError:
+            # Short prefixes can only be forecast over short horizons
+            if capacity == horizon:
+                raise
+            values = predict_model(model.model, horizon)
+        self._forecasts[historical_days] = values
+        self._versions[historical_days] = model.version_info()
+
+        if historical_days not in self._verified:
+            self._verified.add(historical_days)
+            # The verification outcome is stored with the model so restarts skip it
+            scalable = model.metadata.get("scalable")
+            if scalable is None:
+                scalable = all(
+                    self.verify(historical_days, len(values), scale) <= self.tolerance
+                    for scale in VERIFY_SCALES
+                )
+                model.metadata["scalable"] = scalable
+                registry.save(model)
+            elif not scalable:
+                self._unscalable.add(historical_days)
+        return values[:horizon]
+
+    def scalable(self, historical_days):
+        return historical_days not in self._unscalable
+
+    def version(self, historical_days):
+        """Registry version info of the model behind a table entry."""
+        return self._versions.get(historical_days)
+
+    def entry(self, historical_days):
+        """Table entry for ``historical_days``, as accepted by :meth:`store`."""
+        return (self._forecasts[historical_days], self.scalable(historical_days),
+                self._versions[historical_days])
+
+    def store(self, historical_days, values, scalable, version):
+        """Adopt a table entry computed by another engine (e.g. a pool worker)."""
+        cached = self._forecasts.get(historical_days)
+        if cached is None or len(cached) < len(values):
+            self._forecasts[historical_days] = values
+            self._versions[historical_days] = version
+        self._verified.add(historical_days)
+        if not scalable:
+            self._unscalable.add(historical_days)
+
+    def forecast(self, historical_days, horizon, scale_factor):
+        """Forecast ``horizon`` days after ``base_values[:historical_days] * scale_factor``."""
+        unit = self.unit_forecast(historical_days, horizon)
+        if not self.scalable(historical_days):
+            return fit_forecast(self.base_values[:historical_days] * scale_factor, horizon, self.model)
+        return unit * scale_factor
+
+    def verify(self, historical_days, horizon, scale_factor):
+        """Compare the scaled cached forecast with a direct refit.
+
+        Returns the maximum relative error.  Prefixes above the tolerance are
+        marked unscalable and refit on every request.
+        """
+        scaled = self.unit_forecast(historical_days, horizon) * scale_factor
+        direct = fit_forecast(self.base_values[:historical_days] * scale_factor, horizon, self.model)
+        error = float(np.max(np.abs(scaled - direct) / np.maximum(np.abs(direct), 1e-12)))
+        if error > self.tolerance:
+            logger.warning(
+                "Scaled %s forecast for %d historical days deviates by %.2e from a refit; "
+                "falling back to refitting", self.model, historical_days, error
+            )
+            self._unscalable.add(historical_days)
+        return error
+
+    def precompute(self):
+        # Shorter prefixes are forecast with a cheaper model (see model_ladder)
+        for historical_days in range(MIN_LENGTHS[self.model], len(self.base_values) + 1):
+            try:
+                self.unit_forecast(historical_days, self.horizon)
+            except Exception as e:
+                # Very short prefixes cannot always be fitted; requests for
+                # them fail the same way they would without the table.
+                logger.info("Skipping %s precompute for %d historical days: %s", self.model, historical_days, e)
+
+    def stats(self):
+        return {
+            "cached_prefixes": len(self._forecasts),
+            "unscalable_prefixes": sorted(self._unscalable),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+engines = {model: ForecastEngine(model=model) for model in LADDER}
+engine = engines[DEFAULT_MODEL]
@@ -0,0 +1,174 @@
+"""
+Process pool that keeps CPU-bound forecasting off the event loop.
+
+Requests wait for one of ``FORECAST_WORKERS`` slots in a bounded admission
+queue.  When the queue is full they are rejected immediately so callers can
+answer 503 with a Retry-After header instead of piling up behind a slow fit.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import metrics
+from forecast_engine import DEFAULT_MODEL, engines, warm_up
+from model_ladder import ladder
+
+logger = logging.getLogger(__name__)
+
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+FORECAST_QUEUE_SIZE = int(os.getenv("FORECAST_QUEUE_SIZE", "32"))
+FORECAST_TIMEOUT = float(os.getenv("FORECAST_TIMEOUT", "30"))
+FORECAST_RETRY_AFTER = int(os.getenv("FORECAST_RETRY_AFTER", "5"))
+
+
+class ExecutorBusy(Exception):
+    """The admission queue is full."""
+
+
+class ForecastTimeout(Exception):
+    """A forecast did not finish within ``FORECAST_TIMEOUT`` seconds."""
+
+
+def _noop():
+    return None
+
+
+def _traced(fn, args, profile=False):
+    # Timing spans (and stack samples of profiled requests) recorded in a
+    # worker are sent back with the result
+    with metrics.collect() as spans:
+        if not profile:
+            return fn(*args), spans, None
+        with metrics.Sampler(thread=threading.get_ident(), root=f"forecast-worker-{os.getpid()}") as sampler:
+            result = fn(*args)
+    return result, spans, sampler.samples
+
+
+def _forecast_task(historical_days, horizon, scale_factor, model):
+    engine = engines[model]
+    started = time.perf_counter()
+    predictions = engine.forecast(historical_days, horizon, scale_factor)
+    return predictions, engine.entry(historical_days), time.perf_counter() - started
+
+
+class ForecastExecutor:
+    def __init__(self, workers=FORECAST_WORKERS, queue_size=FORECAST_QUEUE_SIZE,
+                 timeout=FORECAST_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._pool = None
+        self._slots = None
+
+    async def start(self):
+        if self.workers > 0:
+            # Spawn rather than fork: the parent already runs an event loop
+            # and client threads that must not be copied into workers.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                # Pay imports and model compilation once per worker, not per request
+                initializer=warm_up
+            )
+            slots = self.workers
+        else:
+            # FORECAST_WORKERS=0 runs forecasts on one background thread
+            self._pool = ThreadPoolExecutor(max_workers=1, initializer=warm_up)
+            slots = 1
+        self._slots = asyncio.Semaphore(slots)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _noop) for _ in range(slots)))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` in the pool, subject to admission and timeout."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        enqueued = time.perf_counter()
+        if self._pool is None:
+            raise ExecutorBusy("Forecast pool is not running")
+        if not self._slots.locked():
+            await self._slots.acquire()
+        elif self.waiting >= self.queue_size:
+            self.rejected += 1
+            raise ExecutorBusy(f"Forecast queue is full ({self.waiting} waiting)")
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise ForecastTimeout(f"Forecast waited more than {self.timeout}s for a worker")
+            finally:
+                self.waiting -= 1
+
+        wait = time.perf_counter() - enqueued
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.running += 1
+        # Thread workers are already sampled along with the API process's threads
+        profile = self.workers > 0 and metrics.profiling()
+        future = self._pool.submit(_traced, fn, args, profile)
+        # The slot is held until the worker is actually free, even if the
+        # caller gives up waiting for the result.
+        future.add_done_callback(lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._release))
+        try:
+            result, spans, samples = await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ForecastTimeout(f"Forecast did not finish within {self.timeout}s")
+        self.completed += 1
+        metrics.record([("pool_wait", wait), ("pool_run", time.perf_counter() - enqueued - wait), *spans])
+        if samples:
+            metrics.record_samples(samples)
+        return result
+
+    def _release(self):
+        self.running -= 1
+        self._slots.release()
+
+    async def forecast(self, historical_days, horizon, scale_factor, model=DEFAULT_MODEL):
+        """Scaled /predict forecast; table hits are answered without the pool."""
+        engine = engines[model]
+        unit = engine.lookup(historical_days, horizon)
+        if unit is not None and engine.scalable(historical_days):
+            return unit * scale_factor
+
+        predictions, entry, seconds = await self.run(_forecast_task, historical_days, horizon, scale_factor, model)
+        engine.store(historical_days, *entry)
+        # Compute time only, so queueing does not count against the model
+        ladder.observe(model, historical_days, horizon, seconds)
+        return predictions
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "mean_wait_seconds": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
+
+
+forecast_executor = ForecastExecutor()
@@ -0,0 +1,239 @@
+"""
+Buffered, batched ingestion of device readings.
+
+``/device-data`` enqueues readings and returns immediately.  A background
+flusher bulk-inserts them into a sink once ``INGEST_BATCH_SIZE`` rows are
+queued or ``INGEST_FLUSH_INTERVAL`` seconds have passed, with at most
+``INGEST_MAX_IN_FLIGHT`` batches being written at a time.
+"""
+import asyncio
+import logging
+import numbers
+import os
+import re
+from datetime import datetime, timedelta
+
+import metrics
+from live import parse_epoch
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "1.0"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100000"))
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "4"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+INGEST_RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "0.5"))
+# "supabase" writes through the Supabase REST API, "database" through DATABASE_URL
+INGEST_SINK = os.getenv("INGEST_SINK", "supabase")
+
+_STOP = object()
+
+
+# Plain decimal epoch seconds, e.g. "1704067200" or "-86400.5"
+EPOCH_PATTERN = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)")
+# Bounds of datetime64[ns], which the bulk path converts through
+EPOCH_MIN, EPOCH_MAX = -9223372036.0, 9223372036.0
+
+_EPOCH_START = datetime(1970, 1, 1)
+
+
+def _is_number(ts):
+    return isinstance(ts, numbers.Real) and not isinstance(ts, bool)
+
+
+def normalize_timestamp(ts):
+    """Normalize a reading's timestamp, or return None if it is not one.
+
+    Epoch seconds (numbers or decimal strings) become ISO 8601 in UTC,
+    rounded to the microsecond; ISO 8601 strings pass through.
+    """
+    if isinstance(ts, str) and EPOCH_PATTERN.fullmatch(ts):
+        ts = float(ts)
+    if _is_number(ts):
+        # Also rejects NaN
+        if not EPOCH_MIN <= ts <= EPOCH_MAX:
+            return None
+        return (_EPOCH_START + timedelta(microseconds=round(ts * 1e6))).isoformat() + 'Z'
+    return ts if parse_epoch(ts) is not None else None
+
+
+def normalize_timestamps(timestamps):
+    """Vectorized :func:`normalize_timestamp` for a pandas Series."""
+    import pandas as pd
+
+    result = pd.Series([None] * len(timestamps), index=timestamps.index, dtype=object)
+    text = timestamps.map(lambda ts: isinstance(ts, str)).astype(bool)
+    epoch_text = text & timestamps.where(text, "").str.fullmatch(EPOCH_PATTERN.pattern)
+    number = timestamps[~text].map(_is_number).astype(bool)
+    numeric = epoch_text | number.reindex(timestamps.index, fill_value=False)
+
+    epoch = pd.to_numeric(timestamps[numeric], errors='coerce').astype(float)
+    epoch = epoch[epoch.between(EPOCH_MIN, EPOCH_MAX)]
+    parsed = pd.to_datetime((epoch * 1e6).round().astype('int64'), unit='us')
+    # Match datetime.isoformat(), which only prints microseconds when non-zero
+    iso = parsed.dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str.removesuffix('.000000')
+    result[iso.index] = iso + 'Z'
+
+    others = timestamps[text & ~epoch_text]
+    valid = others.map(parse_epoch).notna()
+    result[valid[valid].index] = others[valid]
+    return result
+
+
+class IngestBusy(Exception):
+    """The ingestion queue is full."""
+
+
+class Sink:
+    """Destination for batches of readings."""
+
+    async def write(self, rows):
+        raise NotImplementedError
+
+
+class SupabaseSink(Sink):
+    def __init__(self, client, table="device_data"):
+        self.client = client
+        self.table = table
+
+    async def write(self, rows):
+        # The Supabase client is blocking; keep it off the event loop
+        await asyncio.to_thread(lambda: self.client.table(self.table).insert(rows).execute())
+
+
+class DatabaseSink(Sink):
+    """Writes batches to device_data through the pooled async engine."""
+
+    async def write(self, rows):
+        from database import AsyncSessionLocal
+        from repository import Repository
+
+        async with AsyncSessionLocal() as session:
+            await Repository(session).add_readings(rows)
+            await session.commit()
+
+
+class MemorySink(Sink):
+    """Local stand-in for Supabase that keeps every batch in memory."""
+
+    def __init__(self):
+        self.batches = []
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+    async def write(self, rows):
+        self.batches.append(rows)
+
+
+class IngestionPipeline:
+    def __init__(self, sink, batch_size=INGEST_BATCH_SIZE, flush_interval=INGEST_FLUSH_INTERVAL,
+                 queue_size=INGEST_QUEUE_SIZE, max_in_flight=INGEST_MAX_IN_FLIGHT,
+                 max_retries=INGEST_MAX_RETRIES, retry_backoff=INGEST_RETRY_BACKOFF):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.received = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._queue = None
+        self._flusher = None
+        self._slots = None
+        self._in_flight = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued so far and wait for in-flight batches."""
+        if self._flusher is None:
+            return
+        await self._queue.put(_STOP)
+        await self._flusher
+        self._flusher = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight)
+
+    def submit(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise IngestBusy(f"Ingestion queue is full ({self.queue_size} readings)")
+        self.received += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                break
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    row = self._queue.get_nowait()
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch):
+        await self._slots.acquire()
+        task = asyncio.create_task(self._write(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _write(self, batch):
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with metrics.span("ingest_write"):
+                        await self.sink.write(batch)
+                    metrics.ingest_batch_rows.observe(len(batch))
+                    self.written += len(batch)
+                    self.batches += 1
+                    return
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        self.dropped += len(batch)
+                        logger.error("Dropping %d readings after %d attempts: %s", len(batch), attempt + 1, e)
+                        return
+                    self.retries += 1
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight_batches": len(self._in_flight),
+            "received": self.received,
+            "written": self.written,
+            "batches": self.batches,
+            "mean_batch_size": self.written / self.batches if self.batches else 0.0,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,168 @@
+"""
+In-memory live view of device readings.
+
+Each device keeps its last ``LIVE_BUFFER_SIZE`` readings in a fixed-size
+NumPy ring buffer: ``LIVE_BUFFER_SIZE * (1 + len(FIELDS)) * 8`` bytes, i.e.
+56 KiB per device at the default of 1024 readings.  At most
+``LIVE_MAX_DEVICES`` devices are kept; the least recently updated one is
+evicted first.
+
+New readings are fanned out to subscribers through bounded queues.  A
+subscriber that falls ``LIVE_SUBSCRIBER_QUEUE`` readings behind loses its
+oldest pending readings instead of slowing down ingestion.
+"""
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+LIVE_BUFFER_SIZE = int(os.getenv("LIVE_BUFFER_SIZE", "1024"))
+LIVE_MAX_DEVICES = int(os.getenv("LIVE_MAX_DEVICES", "10000"))
+LIVE_SUBSCRIBER_QUEUE = int(os.getenv("LIVE_SUBSCRIBER_QUEUE", "256"))
+LIVE_KEEPALIVE = float(os.getenv("LIVE_KEEPALIVE", "15"))
+
+FIELDS = ["power", "voltage", "current", "energy", "temperature", "humidity"]
+
+
+def parse_epoch(ts):
+    """Epoch seconds of an ISO 8601 timestamp, or None if it is not one."""
+    try:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class RingBuffer:
+    __slots__ = ("capacity", "timestamps", "values", "head", "count")
+
+    def __init__(self, capacity=LIVE_BUFFER_SIZE):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity)
+        self.values = np.zeros((capacity, len(FIELDS)))
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, values):
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def snapshot(self, limit=None):
+        """Oldest-first copies of the last ``limit`` timestamps and value rows."""
+        n = self.count if limit is None else min(limit, self.count)
+        order = np.arange(self.head - n, self.head) % self.capacity
+        return self.timestamps[order], self.values[order]
+
+
+class Subscriber:
+    def __init__(self, device_id, maxsize=LIVE_SUBSCRIBER_QUEUE):
+        self.device_id = device_id
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message):
+        if self.queue.full():
+            # Slow consumer: drop its oldest pending reading
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class LiveHub:
+    def __init__(self, capacity=LIVE_BUFFER_SIZE, max_devices=LIVE_MAX_DEVICES):
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self.published = 0
+        self.skipped = 0
+        self._buffers = OrderedDict()
+        self._subscribers = {}
+
+    def publish(self, reading):
+        """Add a reading to its device's buffer and subscribers.
+
+        Readings without an ISO 8601 timestamp are skipped; returns whether
+        the reading was published.
+        """
+        timestamp = parse_epoch(reading.get("timestamp"))
+        if timestamp is None:
+            self.skipped += 1
+            return False
+        device_id = reading.get("device_id", "default")
+        buffer = self._buffers.get(device_id)
+        if buffer is None:
+            buffer = self._buffers[device_id] = RingBuffer(self.capacity)
+            if len(self._buffers) > self.max_devices:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(device_id)
+        buffer.append(timestamp, [reading[f] for f in FIELDS])
+        self.published += 1
+
+        subscribers = self._subscribers.get(device_id)
+        if subscribers:
+            message = json.dumps(reading)
+            for subscriber in subscribers:
+                subscriber.offer(message)
+        return True
+
+    def recent(self, device_id, limit=None):
+        buffer = self._buffers.get(device_id)
+        if buffer is None:
+            return None
+        timestamps, values = buffer.snapshot(limit)
+        recent = {
+            "device_id": device_id,
+            "points": len(timestamps),
+            "timestamps": [datetime.utcfromtimestamp(ts).isoformat() + 'Z' for ts in timestamps],
+        }
+        for i, field in enumerate(FIELDS):
+            recent[field] = values[:, i].tolist()
+        return recent
+
+    def subscribe(self, device_id):
+        subscriber = Subscriber(device_id)
+        self._subscribers.setdefault(device_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.device_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.device_id]
+
+    async def stream(self, device_id, is_disconnected, snapshot=None):
+        """Server-sent events for a new subscriber until the client goes away."""
+        # Subscribed on first iteration, so a stream that never starts leaves nothing behind
+        subscriber = self.subscribe(device_id)
+        try:
+            recent = self.recent(subscriber.device_id, snapshot)
+            if recent is not None:
+                yield f"event: snapshot\ndata: {json.dumps(recent)}\n\n"
+            while not await is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), LIVE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: reading\ndata: {message}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            "devices": len(self._buffers),
+            "buffer_size": self.capacity,
+            "bytes_per_device": self.capacity * (1 + len(FIELDS)) * 8,
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "dropped": sum(s.dropped for subs in self._subscribers.values() for s in subs),
+            "published": self.published,
+            "skipped": self.skipped,
+        }
+
+
+hub = LiveHub()
@@ -1,21 +1,93 @@
-from fastapi import FastAPI, HTTPException
+# Imported first so the startup report covers every other import
+from startup import report, warm_up
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import random
 from pydantic import BaseModel
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List
 import uuid
 import numpy as np
-import pandas as pd
-from statsforecast import StatsForecast
-from statsforecast.models import MSTL, AutoARIMA
-from supabase import create_client, Client
 import os
+from forecast_engine import BASE_HISTORICAL_VALUES, engine, engines, fit_forecast_batch
+from model_ladder import ladder
+from model_registry import registry
+from forecast_executor import FORECAST_RETRY_AFTER, FORECAST_TIMEOUT, ExecutorBusy, ForecastTimeout, forecast_executor
+import bulk_upload
+import device_series
+from live import hub
+from quality import monitor
+import fleet_forecast
+from device_forecast import DEVICE_FORECAST_MAX_HORIZON, DeviceForecaster, InsufficientHistory
+from ingestion import INGEST_SINK, DatabaseSink, IngestBusy, IngestionPipeline, SupabaseSink, normalize_timestamp
+import metrics
+from metrics import span
+from encoding import DateRange, NotAcceptable, ORJSONResponse, fields, negotiate, respond
+
+report.mark("import")
+
+def create_supabase():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+supabase = None
+
+def supabase_client():
+    # Shared by the ingestion sink and token checks; created on first use
+    global supabase
+    if supabase is None:
+        supabase = create_supabase()
+    return supabase
+
+async def authenticated_user(request: Request) -> uuid.UUID:
+    """Id of the Supabase user whose access token (``Authorization: Bearer``) came with the request."""
+    from supabase import AuthError, AuthRetryableError
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        client = await asyncio.to_thread(supabase_client)
+        # Supabase checks the token's signature and expiry
+        response = await asyncio.to_thread(client.auth.get_user, token)
+    except AuthRetryableError as e:
+        raise HTTPException(status_code=503, detail=f"Auth unavailable: {e}", headers={"Retry-After": "1"})
+    except AuthError:
+        response = None
+    if response is None or response.user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    return uuid.UUID(response.user.id)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with report.phase("client"):
+        if INGEST_SINK == "database":
+            ingestion.sink = DatabaseSink()
+        else:
+            ingestion.sink = SupabaseSink(await asyncio.to_thread(supabase_client))
+    await ingestion.start()
+    # Model imports, JIT compilation and the forecast pool warm up in the
+    # background; /ready reports when they are done
+    warmup = asyncio.create_task(warm_up())
+    scheduler = asyncio.create_task(fleet_forecast.schedule()) if fleet_forecast.FLEET_FORECAST_AT else None
+    yield
+    warmup.cancel()
+    if scheduler is not None:
+        scheduler.cancel()
+    # Flush buffered readings before the worker exits
+    await ingestion.stop()
+    forecast_executor.shutdown()
 
 app = FastAPI(
     title="Energy Consumption Predictor API",
     description="API for energy consumption prediction and time series forecasting",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -27,11 +99,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create model instance with MSTL decomposition
-model = MSTL(
-    season_length=[7],  # Weekly seasonality
-    trend_forecaster=AutoARIMA()
-)
+# Request latency histograms, optional Server-Timing headers and X-Profile profiles
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Raw batch series are fitted in chunks spread over the forecast pool
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "500"))
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "10000"))
+MAX_HISTORY_PAGE = int(os.getenv("MAX_HISTORY_PAGE", "100"))
 
 # Energy consumption factors
 ENERGY_FACTORS = {
@@ -62,6 +136,10 @@ class ComparisonInput(BaseModel):
     end_date: str
     historical_values: Optional[List[float]] = None
 
+class BatchPredictionInput(BaseModel):
+    # Each item is an ApplianceInput or a TimeSeriesInput payload
+    items: List[Dict[str, Any]]
+
 class DeviceData(BaseModel):
     temperature: float
     humidity: float
@@ -72,91 +150,271 @@ class DeviceData(BaseModel):
     timestamp: str  # ISO format
     device_id: str = "default"
 
-# Initialize Supabase client using environment variables
+# Supabase client settings; the client itself is created in lifespan
 SUPABASE_URL = os.getenv("VITE_SUPABASE_URL")
 SUPABASE_KEY = os.getenv("VITE_SUPABASE_SERVICE_ROLE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Device readings are buffered and bulk-inserted in the background
+ingestion = IngestionPipeline(sink=None)
+
+# Per-device forecasts from real meter history, cached between refits
+device_forecaster = DeviceForecaster(forecast_executor)
+
+def plan_prediction(input_data: ApplianceInput):
+    # Parse dates
+    start_date = datetime.strptime(input_data.start_date, "%Y-%m-%d").date()
+    end_date = datetime.strptime(input_data.end_date, "%Y-%m-%d").date()
+    
+    # Calculate number of days
+    days = (end_date - start_date).days + 1  # Add 1 to include both start and end dates
+    if days <= 0:
+        raise HTTPException(status_code=400, detail="End date must be after start date")
+    
+    # Calculate total appliances
+    total_appliances = sum(input_data.appliances.values())
+    if total_appliances <= 0:
+        raise HTTPException(status_code=400, detail="At least one appliance is required")
+    
+    # Calculate base consumption
+    base_consumption = 0
+    for appliance_type, count in input_data.appliances.items():
+        daily_factor = ENERGY_FACTORS.get(appliance_type, ENERGY_FACTORS["default"])
+        base_consumption += daily_factor * count
+    
+    base_historical_values = BASE_HISTORICAL_VALUES
+    
+    # Calculate how many historical days we need
+    historical_days = min(days // 2, len(base_historical_values))
+    if historical_days == 0:
+        raise HTTPException(status_code=400, detail="Date range must cover at least 2 days")
+    
+    # Calculate scale factor based on base consumption
+    scale_factor = base_consumption / np.mean(base_historical_values)
+    
+    # Scale historical values
+    historical_values = np.asarray(base_historical_values[:historical_days], dtype=float) * scale_factor
+    
+    return {
+        "start_date": start_date,
+        "days": days,
+        "total_appliances": total_appliances,
+        "historical_days": historical_days,
+        "scale_factor": scale_factor,
+        "historical_values": historical_values,
+        "future_days": days - len(historical_values),
+    }
+
+def build_prediction(plan, time_series_predictions, model=None, forecast_model=None):
+    # Arrays and the date range are encoded by respond() in the negotiated format
+    historical_values = plan["historical_values"]
+    
+    # Calculate total consumption
+    total_consumption = float(historical_values.sum() + time_series_predictions.sum())
+    
+    return {
+        "id": str(uuid.uuid4()),
+        "consumption": total_consumption,
+        "days": plan["days"],
+        "total_appliances": plan["total_appliances"],
+        "historical_values": historical_values,
+        "time_series_predictions": time_series_predictions,
+        "dates": DateRange(plan["start_date"], plan["days"]),
+        "model": model,
+        "forecast_model": forecast_model
+    }
+
+def prediction_table(prediction):
+    # Arrow layout: one row per day, flagged once the forecast starts
+    values = np.concatenate([prediction["historical_values"], prediction["time_series_predictions"]])
+    return {
+        "date": prediction["dates"],
+        "value": values,
+        "forecast": np.arange(len(values)) >= len(prediction["historical_values"])
+    }
+
+async def wait_until_ready():
+    """Hold a forecast request while the warmup runs, at most FORECAST_TIMEOUT seconds."""
+    try:
+        await asyncio.wait_for(report.wait(), FORECAST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ExecutorBusy("Still warming up")
+    # The forecast pool was never started
+    if report.error is not None:
+        raise ExecutorBusy(f"Warmup failed: {report.error}")
+
+async def forecast_plan(plan, budget_ms=None):
+    """Forecast a plan's future days; returns ``(predictions, model, version)``.
+
+    A model that fails or forecasts non-finite values is replaced by the next
+    cheaper one the history supports; the last failure is raised.
+    """
+    historical_days, future_days = plan["historical_days"], plan["future_days"]
+    chosen = ladder.choose(historical_days, future_days, budget_ms)
+    for model in ladder.fallbacks(chosen, historical_days):
+        try:
+            predictions = await forecast_executor.forecast(historical_days, future_days, plan["scale_factor"], model)
+        except ValueError as e:
+            error = e
+            continue
+        if np.isfinite(predictions).all():
+            return predictions, model, engines[model].version(historical_days)
+        error = ValueError(f"{model} cannot forecast from {historical_days} historical days")
+    raise error
 
 @app.post("/predict")
-async def predict_energy(input_data: ApplianceInput):
+async def predict_energy(input_data: ApplianceInput, request: Request, format: Optional[str] = None,
+                         budget_ms: Optional[float] = None):
+    if budget_ms is not None and budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="budget_ms must be positive")
     try:
-        # Parse dates
-        start_date = datetime.strptime(input_data.start_date, "%Y-%m-%d").date()
-        end_date = datetime.strptime(input_data.end_date, "%Y-%m-%d").date()
-        
-        # Calculate number of days
-        days = (end_date - start_date).days + 1  # Add 1 to include both start and end dates
-        if days <= 0:
-            raise HTTPException(status_code=400, detail="End date must be after start date")
-        
-        # Calculate total appliances
-        total_appliances = sum(input_data.appliances.values())
-        if total_appliances <= 0:
-            raise HTTPException(status_code=400, detail="At least one appliance is required")
-        
-        # Calculate base consumption
-        base_consumption = 0
-        for appliance_type, count in input_data.appliances.items():
-            daily_factor = ENERGY_FACTORS.get(appliance_type, ENERGY_FACTORS["default"])
-            base_consumption += daily_factor * count
-        
-        # Static historical values (21 days)
-        base_historical_values = [
-            100, 105, 102, 108, 106, 110, 105,  # Week 1
-            103, 107, 104, 109, 108, 112, 107,  # Week 2
-            105, 108, 106, 111, 110, 115, 109   # Week 3
-        ]
+        fmt = negotiate(request.headers.get("accept"), format)
+        with span("plan"):
+            plan = plan_prediction(input_data)
+        await wait_until_ready()
         
-        # Calculate how many historical days we need
-        historical_days = min(days // 2, len(base_historical_values))
-        
-        # Calculate scale factor based on base consumption
-        scale_factor = base_consumption / np.mean(base_historical_values)
-        
-        # Scale historical values
-        historical_values = [v * scale_factor for v in base_historical_values[:historical_days]]
-        
-        # Use MSTL model for future predictions
-        dates = pd.date_range(start=start_date, periods=historical_days, freq='D')
-        df = pd.DataFrame({
-            'unique_id': ['ts1'] * historical_days,
-            'ds': dates,
-            'y': historical_values
-        })
-        
-        # Create StatsForecast object with the model
-        sf = StatsForecast(
-            models=[model],
-            freq='D'
-        )
-        
-        # Make prediction for the remaining days
-        future_days = days - len(historical_values)
-        if future_days > 0:
-            forecast = sf.forecast(df=df, h=future_days)
-            # Extract and scale predictions
-            time_series_predictions = forecast.filter(like='MSTL').iloc[:, 0].tolist()
+        # Make prediction for the remaining days from the precomputed unit forecasts
+        model = version = None
+        if plan["future_days"] > 0:
+            with span("forecast"):
+                time_series_predictions, model, version = await forecast_plan(plan, budget_ms)
         else:
-            time_series_predictions = []
-        
-        # Calculate total consumption
-        total_consumption = sum(historical_values) + (sum(time_series_predictions) if time_series_predictions else 0)
+            time_series_predictions = np.empty(0)
         
-        return {
-            "id": str(uuid.uuid4()),
-            "consumption": total_consumption,
-            "days": days,
-            "total_appliances": total_appliances,
-            "historical_values": historical_values,
-            "time_series_predictions": time_series_predictions,
-            "dates": pd.date_range(start=start_date, periods=days, freq='D').strftime('%Y-%m-%d').tolist()
-        }
+        with span("serialize"):
+            prediction = build_prediction(plan, time_series_predictions, version, model)
+            return respond(fmt, prediction, prediction_table)
         
+    except HTTPException:
+        raise
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(FORECAST_RETRY_AFTER)})
+    except ForecastTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
     except Exception as e:
+        metrics.errors.inc("/predict", type(e).__name__)
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+@app.post("/predict/batch")
+async def predict_batch(batch: BatchPredictionInput):
+    if len(batch.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    
+    results = [None] * len(batch.items)
+    plans = {}
+    series = {}
+    horizons = {}
+    for index, item in enumerate(batch.items):
+        try:
+            if "appliances" in item:
+                plan = plan_prediction(ApplianceInput(**item))
+                plans[index] = plan
+            else:
+                ts = TimeSeriesInput(**item)
+                if not ts.values:
+                    raise ValueError("At least one value is required")
+                if ts.horizon <= 0:
+                    raise ValueError("Horizon must be positive")
+                series[index] = ts.values
+                horizons[index] = ts.horizon
+        except HTTPException as e:
+            results[index] = {"index": index, "status": "error", "error": e.detail}
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "error": f"Invalid input: {str(e)}"}
+    
+    try:
+        await wait_until_ready()
+        # Appliance items take the /predict path concurrently; table hits are
+        # answered inline and misses share the pool with the raw series
+        async def forecast_item(index, plan):
+            try:
+                predictions, model, version = await forecast_plan(plan)
+                results[index] = build_prediction(plan, predictions, version, model)
+            except ValueError as e:
+                results[index] = {"index": index, "status": "error", "error": f"Invalid input: {str(e)}"}
+        
+        with span("batch_forecast"):
+            await asyncio.gather(*(forecast_item(index, plan) for index, plan in plans.items()))
+        
+        # Raw series are fitted in the forecast pool, one StatsForecast call
+        # per chunk, under the same admission queue and timeout as /predict
+        if series:
+            ids = list(series)
+            chunks = [ids[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(ids), BATCH_CHUNK_SIZE)]
+            with span("batch_fit"):
+                fitted = await asyncio.gather(*(
+                    forecast_executor.run(fit_forecast_batch, {i: series[i] for i in chunk},
+                                          {i: horizons[i] for i in chunk}, 1)
+                    for chunk in chunks
+                ))
+            forecasts, errors = {}, {}
+            for chunk_forecasts, chunk_errors in fitted:
+                forecasts.update(chunk_forecasts)
+                errors.update(chunk_errors)
+            for index in series:
+                if index in errors:
+                    results[index] = {"index": index, "status": "error", "error": f"Prediction error: {errors[index]}"}
+                else:
+                    results[index] = {"predictions": forecasts[index], "horizon": horizons[index]}
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(FORECAST_RETRY_AFTER)})
+    except ForecastTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    
+    for index, result in enumerate(results):
+        if result.get("status") != "error":
+            results[index] = {"index": index, "status": "success", "result": fields(result)}
+    failed = sum(result["status"] == "error" for result in results)
+    # Returned as a response so the NumPy arrays go straight to orjson
+    return ORJSONResponse({"results": results, "succeeded": len(results) - failed, "failed": failed})
+
+@app.get("/forecast/device/{device_id}")
+async def forecast_device(device_id: str, request: Request, horizon: int = 7, max_age: Optional[float] = None,
+                          format: Optional[str] = None):
+    if not 1 <= horizon <= DEVICE_FORECAST_MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"Horizon must be between 1 and {DEVICE_FORECAST_MAX_HORIZON}")
+    try:
+        fmt = negotiate(request.headers.get("accept"), format)
+        await wait_until_ready()
+        forecast = await device_forecaster.forecast(device_id, horizon, max_age)
+        return respond(fmt, forecast, lambda f: {"date": f["dates"], "prediction": f["predictions"]})
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    except InsufficientHistory as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(FORECAST_RETRY_AFTER)})
+    except ForecastTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        metrics.errors.inc("/forecast/device/{device_id}", type(e).__name__)
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+@app.get("/predictions")
+async def prediction_history(user_id: uuid.UUID = Depends(authenticated_user), limit: int = 20,
+                             cursor: Optional[str] = None):
+    # Only the caller's own history; the service-role session bypasses RLS
+    # Keyset pagination: pass next_cursor from the previous page to continue
+    from database import AsyncSessionLocal
+    from repository import Repository, decode_cursor
+
+    if not 1 <= limit <= MAX_HISTORY_PAGE:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_HISTORY_PAGE}")
+    try:
+        after = decode_cursor(cursor) if cursor is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        async with AsyncSessionLocal() as session:
+            items, next_cursor = await Repository(session).prediction_page(user_id, limit, after)
+        return {"items": items, "next_cursor": next_cursor}
+    except Exception as e:
+        metrics.errors.inc("/predictions", type(e).__name__)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Energy Consumption Predictor API"}
@@ -165,24 +423,175 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    # Unlike /health, only succeeds once models are compiled and workers are warm
+    if report.error is not None:
+        raise HTTPException(status_code=503, detail=f"Warmup failed: {report.error}")
+    if not report.ready:
+        raise HTTPException(status_code=503, detail="Warming up", headers={"Retry-After": "1"})
+    return {"status": "ready"}
+
+@app.get("/startup")
+async def startup_report():
+    return report.stats()
+
+@app.get("/forecast/executor")
+async def forecast_executor_stats():
+    return {
+        **forecast_executor.stats(),
+        "table": engine.stats(),
+        "ladder": ladder.stats(),
+        "registry": registry.stats(),
+        "devices": device_forecaster.stats()
+    }
+
 @app.post("/device-data")
 async def receive_device_data(data: DeviceData):
     try:
         # Convert epoch seconds to ISO 8601 if needed
-        ts = data.timestamp
-        if isinstance(ts, (int, float)) or (isinstance(ts, str) and ts.isdigit()):
-            # If timestamp is a number or numeric string, treat as epoch seconds
-            epoch = float(ts)
-            iso_ts = datetime.utcfromtimestamp(epoch).isoformat() + 'Z'
+        with span("normalize"):
             data_dict = data.dict()
-            data_dict["timestamp"] = iso_ts
-        else:
-            data_dict = data.dict()
-        supabase.table("device_data").insert(data_dict).execute()
+            data_dict["timestamp"] = normalize_timestamp(data.timestamp)
+        if data_dict["timestamp"] is None:
+            raise HTTPException(status_code=400, detail=f"Invalid timestamp: {data.timestamp!r}")
+        # Flag or quarantine the reading against its device's running statistics
+        with span("quality"):
+            issues = monitor.check(data_dict)
+        if issues and issues[0]["action"] == "quarantine":
+            return {"status": "quarantined", "issues": issues}
+        ingestion.submit(data_dict)
+        with span("publish"):
+            hub.publish(data_dict)
+        if issues:
+            return {"status": "success", "issues": issues}
         return {"status": "success"}
+    except HTTPException:
+        raise
+    except IngestBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        metrics.errors.inc("/device-data", type(e).__name__)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/device-data/bulk")
+async def upload_device_data(request: Request, format: Optional[str] = None):
+    # Format comes from ?format= or the Content-Type (text/csv or NDJSON)
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    try:
+        summary = await bulk_upload.upload(request.stream(), format)
+    except Exception as e:
+        metrics.errors.inc("/device-data/bulk", type(e).__name__)
+        raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
+    if summary["status"] != "success":
+        # Earlier chunks are committed; report them so the client can resume
+        metrics.errors.inc("/device-data/bulk", "ChunkFailed")
+        return ORJSONResponse(summary, status_code=500)
+    return summary
+
+@app.get("/devices/{device_id}/series")
+async def get_device_series(device_id: str, request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                            resolution: str = "hour", points: int = 1000, since: Optional[str] = None,
+                            metric: str = "power", format: Optional[str] = None):
+    if resolution not in device_series.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Resolution must be one of {', '.join(device_series.RESOLUTIONS)}")
+    if metric not in device_series.METRICS:
+        raise HTTPException(status_code=400, detail=f"Metric must be one of {', '.join(device_series.METRICS)}")
+    if not 3 <= points <= device_series.SERIES_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Points must be between 3 and {device_series.SERIES_MAX_POINTS}")
+    try:
+        fmt = negotiate(request.headers.get("accept"), format)
+        series = await run_in_threadpool(device_series.query_series, device_id, start, end, resolution, points, since, metric)
+        return respond(fmt, series, lambda s: {"timestamp": s["timestamps"], **{m: s[m] for m in device_series.METRICS}})
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
     except Exception as e:
+        metrics.errors.inc("/devices/{device_id}/series", type(e).__name__)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/devices/{device_id}/recent")
+async def get_recent_readings(device_id: str, limit: Optional[int] = None):
+    recent = hub.recent(device_id, limit)
+    if recent is None:
+        raise HTTPException(status_code=404, detail="No live readings for this device")
+    return recent
+
+@app.get("/devices/{device_id}/live")
+async def stream_live_readings(device_id: str, request: Request, snapshot: Optional[int] = 100):
+    # Server-sent events: a snapshot of the ring buffer, then each new reading
+    return StreamingResponse(
+        hub.stream(device_id, request.is_disconnected, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/device-data/ingestion")
+async def ingestion_stats():
+    return {**ingestion.stats(), "live": hub.stats(), "quality": monitor.stats()}
+
+@app.get("/device-data/quality/events")
+async def quality_events(since: int = 0, limit: int = 100, device_id: Optional[str] = None):
+    if not 1 <= limit <= MAX_HISTORY_PAGE:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {MAX_HISTORY_PAGE}")
+    events, next_since = monitor.events_since(since, limit, device_id)
+    return {"events": events, "next_since": next_since}
+
+@metrics.collector
+def service_metrics():
+    executor = forecast_executor.stats()
+    ingest = ingestion.stats()
+    tables = [table.stats() for table in engines.values()]
+    chosen = ladder.stats()
+    models = registry.stats()
+    devices = device_forecaster.stats()
+    live = hub.stats()
+    checks = monitor.stats()
+    return [
+        ("ecotrack_ready", "gauge", "1 once the startup warmup has finished.", int(report.ready)),
+        ("ecotrack_forecast_queue_depth", "gauge", "Forecasts waiting for a pool worker.", executor["queue_depth"]),
+        ("ecotrack_forecast_running", "gauge", "Forecasts running in the pool.", executor["running"]),
+        ("ecotrack_forecast_rejected_total", "counter", "Forecasts rejected with 503.", executor["rejected"]),
+        ("ecotrack_forecast_timeouts_total", "counter", "Forecasts answered with 504.", executor["timeouts"]),
+        ("ecotrack_ingest_queue_depth", "gauge", "Readings waiting to be written.", ingest["queue_depth"]),
+        ("ecotrack_ingest_in_flight_batches", "gauge", "Batches being written.", ingest["in_flight_batches"]),
+        ("ecotrack_ingest_readings_total", "counter", "Device readings by outcome.", {
+            (("outcome", outcome),): ingest[outcome] for outcome in ("received", "written", "dropped", "rejected")
+        }),
+        ("ecotrack_cache_hits_total", "counter", "Cache hits by cache.", {
+            (("cache", "forecast_table"),): sum(table["hits"] for table in tables),
+            (("cache", "model_registry"),): models["hits"],
+            (("cache", "device_forecast"),): devices["hits"],
+        }),
+        ("ecotrack_cache_misses_total", "counter", "Cache misses by cache.", {
+            (("cache", "forecast_table"),): sum(table["misses"] for table in tables),
+            (("cache", "model_registry"),): models["loads"] + models["fits"],
+            (("cache", "device_forecast"),): devices["refreshes"],
+        }),
+        ("ecotrack_forecast_model_total", "counter", "/predict forecasts by ladder model.", {
+            (("model", model),): count for model, count in chosen["chosen"].items()
+        }),
+        ("ecotrack_forecast_downgrades_total", "counter", "Forecasts moved to a cheaper model by the budget.",
+         chosen["downgrades"]),
+        ("ecotrack_model_fits_total", "counter", "Models fitted because the registry had none.", models["fits"]),
+        ("ecotrack_quality_checked_total", "counter", "Device readings run through the quality checks.",
+         checks["checked"]),
+        ("ecotrack_quality_quarantined_total", "counter", "Device readings quarantined.", checks["quarantined"]),
+        ("ecotrack_quality_events_total", "counter", "Quality events by kind.", {
+            (("kind", kind),): count for kind, count in checks["events"].items()
+        }),
+        ("ecotrack_live_devices", "gauge", "Devices with a live ring buffer.", live["devices"]),
+        ("ecotrack_live_subscribers", "gauge", "Open live streams.", live["subscribers"]),
+    ]
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
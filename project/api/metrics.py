@@ -0,0 +1,297 @@
+"""
+Per-stage timing spans, Prometheus metrics and on-demand profiling.
+
+Code on the request path wraps its stages in :func:`span`.  Each span is
+observed in the ``ecotrack_stage_seconds`` histogram and, with
+``SERVER_TIMING=1``, reported back in a ``Server-Timing`` response header
+(off by default: formatting it costs more than the rest of the request
+instrumentation together).  Spans recorded inside
+forecast pool workers are collected with :func:`collect` and replayed in the
+API process with :func:`record`.
+
+``/metrics`` renders every metric in the Prometheus text format.  Values
+that already live elsewhere (queue depths, cache hits) are read from
+collectors registered with :func:`collector` at scrape time, so the hot path
+only pays for histogram updates.
+
+When ``PROFILE_TOKEN`` is set, a request carrying ``X-Profile: <token>`` is
+sampled every ``PROFILE_INTERVAL`` seconds and answered with the collapsed
+stacks of every thread (the input format of flamegraph.pl and speedscope)
+instead of its normal body.  Forecast pool worker processes sample their
+own stacks while running the request's jobs and send them back with the
+result, like spans; their stacks start with ``forecast-worker-<pid>``.
+"""
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_HEADER = b"x-profile"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000, 5000, 10000, 50000)
+
+_spans = ContextVar("spans", default=None)
+_sampler = ContextVar("sampler", default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), then sum and count
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {series[-1]}"
+
+
+request_seconds = Histogram("ecotrack_request_seconds", "Request latency by route.", labels=("method", "route", "status"))
+stage_seconds = Histogram("ecotrack_stage_seconds", "Time spent in each named request stage.", labels=("stage",))
+ingest_batch_rows = Histogram("ecotrack_ingest_batch_rows", "Rows per ingestion batch written to the sink.",
+                              buckets=SIZE_BUCKETS)
+errors = Counter("ecotrack_errors_total", "Unexpected exceptions answered with a 500, by route and type.",
+                 labels=("route", "exception"))
+
+_metrics = [request_seconds, stage_seconds, ingest_batch_rows, errors]
+_collectors = []
+
+
+def collector(fn):
+    """Register ``fn() -> [(name, type, help, value)]`` to be read at scrape time.
+
+    ``value`` is a number or a dict mapping a label tuple ``((name, value), ...)``
+    to a number.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+class span:
+    """Time a ``with`` block as ``stage``."""
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stage_seconds.observe(elapsed, self.stage)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((self.stage, elapsed))
+
+
+@contextmanager
+def collect():
+    """Collect the spans recorded in this context, e.g. inside a pool worker."""
+    spans = []
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+
+def record(spans):
+    """Replay spans collected elsewhere into this process and request."""
+    current = _spans.get()
+    for stage, elapsed in spans:
+        stage_seconds.observe(elapsed, stage)
+        if current is not None:
+            current.append((stage, elapsed))
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for fn in _collectors:
+        for name, kind, help, value in fn():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if isinstance(value, dict):
+                for labels, number in value.items():
+                    names, values = zip(*labels)
+                    lines.append(f"{name}{_labels(names, values)} {number}")
+            else:
+                lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class Sampler:
+    """Samples the stacks of all other threads into collapsed-stack counts.
+
+    With ``thread`` only that thread is sampled, and its stacks start with
+    ``root`` instead of the thread's name.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, thread=None, root=None):
+        self.interval = interval
+        self.thread = thread
+        self.root = root
+        self.samples = Tally()
+        # Samples taken in other processes (see record_samples)
+        self.remote = Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me or self.thread not in (None, ident):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(self.root or names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in (self.samples + self.remote).most_common())
+
+
+def profiling():
+    """Whether the current request is being profiled."""
+    return _sampler.get() is not None
+
+
+def record_samples(samples):
+    """Add stack samples taken elsewhere, e.g. in a pool worker, to the current profile."""
+    sampler = _sampler.get()
+    if sampler is not None:
+        sampler.remote.update(samples)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request and serving opt-in profiles."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        if PROFILE_TOKEN is not None:
+            token = dict(scope["headers"]).get(PROFILE_HEADER)
+            if token is not None and token.decode() == PROFILE_TOKEN:
+                return await self._profile(scope, receive, send)
+
+        spans = token = None
+        if SERVER_TIMING:
+            spans = []
+            token = _spans.set(spans)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if spans:
+                    timing = ", ".join(f"{stage};dur={elapsed * 1000:.3f}" for stage, elapsed in spans)
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                _spans.reset(token)
+            route = scope.get("route")
+            request_seconds.observe(time.perf_counter() - started, scope["method"],
+                                    route.path if route is not None else "unmatched", status)
+
+    async def _profile(self, scope, receive, send):
+        status = None
+
+        async def discard(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        with Sampler() as sampler:
+            token = _sampler.set(sampler)
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                _sampler.reset(token)
+        body = sampler.collapsed().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,28 @@
+"""Add fitted model registry
+
+Revision ID: fitted_models
+Revises: initial
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'fitted_models'
+down_revision = 'initial'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Create fitted_models table
+    op.create_table(
+        'fitted_models',
+        sa.Column('key', sa.String(), primary_key=True),
+        sa.Column('fingerprint', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'))
+    )
+
+def downgrade() -> None:
+    op.drop_table('fitted_models')
\ No newline at end of file
@@ -0,0 +1,23 @@
+"""Add device_id to forecasts
+
+Revision ID: forecast_device
+Revises: fitted_models
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'forecast_device'
+down_revision = 'fitted_models'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Fleet forecasts are per device rather than per prediction
+    op.add_column('forecasts', sa.Column('device_id', sa.String(), nullable=True))
+    op.create_index('ix_forecasts_device_id', 'forecasts', ['device_id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_forecasts_device_id', table_name='forecasts')
+    op.drop_column('forecasts', 'device_id')
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""Add indexes for prediction history and device queries
+
+Revision ID: history_indexes
+Revises: forecast_device
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+
+revision = 'history_indexes'
+down_revision = 'forecast_device'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Keyset pagination of prediction history: user, newest first, id as tie-breaker
+    op.create_index('ix_predictions_user_created', 'predictions', ['user_id', 'created_at', 'id'])
+    op.create_index('ix_forecasts_user_created', 'forecasts', ['user_id', 'created_at'])
+
+    # device_data takes live writes; build its index without locking them out
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_device_data_device_timestamp', 'device_data', ['device_id', 'timestamp'],
+            postgresql_concurrently=True
+        )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_device_data_device_timestamp', table_name='device_data', postgresql_concurrently=True)
+    op.drop_index('ix_forecasts_user_created', table_name='forecasts')
+    op.drop_index('ix_predictions_user_created', table_name='predictions')
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Latency-budgeted model selection for /predict.
+
+Forecasts use MSTL (``DEFAULT_MODEL``) unless a latency budget is set,
+from ``?budget_ms=`` or ``FORECAST_BUDGET_MS`` for the whole deployment.
+With a budget the ladder steps down to cheaper models while the expected
+cost exceeds it, but only to models the history is long enough for (see
+``MIN_LENGTHS``).  Models whose table already holds the forecast cost
+nothing and are always within budget.  A model that fails or forecasts
+non-finite values is replaced by the next cheaper one (see
+:meth:`ModelLadder.fallbacks`).
+
+Expected costs are the compute times of earlier table misses of the same
+model and size, kept as an exponentially weighted mean and variance.  The
+estimate is the mean plus two standard deviations, so the budget bounds the
+tail rather than the average.  :meth:`ModelLadder.calibrate` seeds them at
+startup.  The budget covers the forecast itself, not the wait for a pool
+worker, which admission control bounds separately.
+
+``python benchmark.py`` reports the holdout accuracy and fit time of each
+model.
+"""
+import math
+import os
+import time
+from collections import Counter
+
+from forecast_engine import (BASE_HISTORICAL_VALUES, DEFAULT_MODEL, FORECAST_HORIZON, LADDER, MIN_LENGTHS,
+                             engines, fit_forecast)
+
+FORECAST_BUDGET_MS = float(os.getenv("FORECAST_BUDGET_MS", "0")) or None
+FORECAST_COST_ALPHA = float(os.getenv("FORECAST_COST_ALPHA", "0.2"))
+
+
+def _size(length, horizon):
+    # Table misses forecast at least FORECAST_HORIZON days
+    return length.bit_length(), max(horizon, FORECAST_HORIZON).bit_length()
+
+
+class ModelLadder:
+    def __init__(self, budget_ms=FORECAST_BUDGET_MS, alpha=FORECAST_COST_ALPHA):
+        self.budget_ms = budget_ms
+        self.alpha = alpha
+        self.chosen = Counter()
+        self.downgrades = 0
+        # (model, size) -> [mean, variance] of seconds
+        self._costs = {}
+
+    def observe(self, model, length, horizon, seconds):
+        key = (model, _size(length, horizon))
+        stats = self._costs.get(key)
+        if stats is None:
+            self._costs[key] = [seconds, 0.0]
+            return
+        delta = seconds - stats[0]
+        stats[0] += self.alpha * delta
+        stats[1] = (1 - self.alpha) * (stats[1] + self.alpha * delta * delta)
+
+    def estimate(self, model, length, horizon):
+        """Expected seconds for a table miss, or None before any observation."""
+        stats = self._costs.get((model, _size(length, horizon)))
+        if stats is not None:
+            return stats[0] + 2 * math.sqrt(stats[1])
+        # Sizes not seen yet are assumed as slow as the slowest one seen
+        seen = [mean + 2 * math.sqrt(variance)
+                for (name, _), (mean, variance) in self._costs.items() if name == model]
+        return max(seen) if seen else None
+
+    def fallbacks(self, model, historical_days):
+        """``model`` followed by the cheaper models usable on ``historical_days``."""
+        cheaper = LADDER[:LADDER.index(model)]
+        return [model, *(name for name in reversed(cheaper) if historical_days >= MIN_LENGTHS[name])]
+
+    def choose(self, historical_days, horizon, budget_ms=None):
+        """Name of the model to forecast ``horizon`` days after ``historical_days``."""
+        if budget_ms is None:
+            budget_ms = self.budget_ms
+        model = DEFAULT_MODEL
+        if budget_ms is not None:
+            for model in self.fallbacks(DEFAULT_MODEL, historical_days):
+                if engines[model].cached(historical_days, horizon):
+                    break
+                cost = self.estimate(model, historical_days, horizon)
+                if cost is not None and cost * 1000 <= budget_ms:
+                    break
+            if model != DEFAULT_MODEL:
+                self.downgrades += 1
+        self.chosen[model] += 1
+        return model
+
+    def calibrate(self, values=BASE_HISTORICAL_VALUES, horizon=FORECAST_HORIZON):
+        """Time one forecast per model so budgets apply from the first request."""
+        for model in LADDER:
+            started = time.perf_counter()
+            fit_forecast(values, horizon, model)
+            self.observe(model, len(values), horizon, time.perf_counter() - started)
+
+    def stats(self):
+        return {
+            "budget_ms": self.budget_ms,
+            "chosen": dict(self.chosen),
+            "downgrades": self.downgrades,
+            "estimated_ms": {
+                f"{model}/n<{2 ** length},h<{2 ** horizon}": (mean + 2 * math.sqrt(variance)) * 1000
+                for (model, (length, horizon)), (mean, variance) in self._costs.items()
+            },
+        }
+
+
+ladder = ModelLadder()
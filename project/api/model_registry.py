@@ -0,0 +1,212 @@
+"""
+Versioned registry of fitted forecasting models.
+
+Fitted models are keyed by series identity (e.g. ``predict/unit/14`` or a
+device id) and tagged with a fingerprint of the training data and model
+spec.  A lookup with an unchanged fingerprint returns the stored model, so
+repeat forecasts cost a ``predict`` call instead of a full fit.  Models are
+persisted to disk (or to the ``fitted_models`` Postgres table) and held in
+memory behind an LRU bound.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_REGISTRY_BACKEND = os.getenv("MODEL_REGISTRY_BACKEND", "disk")
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", os.path.join(API_DIR, "model_registry"))
+MODEL_REGISTRY_CACHE_SIZE = int(os.getenv("MODEL_REGISTRY_CACHE_SIZE", "256"))
+
+# Bump when the stored record layout changes; older records are refitted
+REGISTRY_FORMAT = 1
+
+
+def fingerprint(values, spec):
+    digest = hashlib.sha256(spec.encode())
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class RegisteredModel:
+    def __init__(self, key, fingerprint, version, model, fitted_at=None, metadata=None):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.version = version
+        self.model = model
+        self.fitted_at = fitted_at or datetime.now(timezone.utc).isoformat()
+        self.metadata = metadata or {}
+
+    def version_info(self):
+        return {
+            "key": self.key,
+            "version": self.version,
+            "fingerprint": self.fingerprint[:12],
+            "fitted_at": self.fitted_at,
+        }
+
+    def to_record(self):
+        return {
+            "format": REGISTRY_FORMAT,
+            "key": self.key,
+            "fingerprint": self.fingerprint,
+            "version": self.version,
+            "fitted_at": self.fitted_at,
+            "metadata": self.metadata,
+            "model": self.model,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record["key"], record["fingerprint"], record["version"], record["model"],
+                   record["fitted_at"], record["metadata"])
+
+
+class DiskStore:
+    def __init__(self, directory=MODEL_REGISTRY_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        # The hash keeps keys that sanitize alike (device/a_b, device/a/b) apart
+        readable = re.sub(r"[^A-Za-z0-9_.-]", "_", key)[:64]
+        return os.path.join(self.directory, f"{readable}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.pkl")
+
+    def load(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, record):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Write then rename so concurrent workers never read a partial file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+
+class PostgresStore:
+    def load(self, key):
+        from database import SessionLocal
+        from models import FittedModel
+
+        with SessionLocal() as db:
+            row = db.get(FittedModel, key)
+            return pickle.loads(row.payload) if row is not None else None
+
+    def save(self, key, record):
+        from database import SessionLocal
+        from models import FittedModel
+
+        with SessionLocal() as db:
+            db.merge(FittedModel(
+                key=key,
+                fingerprint=record["fingerprint"],
+                version=record["version"],
+                payload=pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL),
+            ))
+            db.commit()
+
+
+class ModelRegistry:
+    def __init__(self, store, capacity=MODEL_REGISTRY_CACHE_SIZE):
+        self.store = store
+        self.capacity = capacity
+        self.hits = 0
+        self.loads = 0
+        self.fits = 0
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, entry):
+        with self._lock:
+            self._models[entry.key] = entry
+            self._models.move_to_end(entry.key)
+            while len(self._models) > self.capacity:
+                self._models.popitem(last=False)
+
+    def _load(self, key):
+        try:
+            record = self.store.load(key)
+        except Exception as e:
+            logger.warning("Could not load model %s: %s", key, e)
+            return None
+        if record is None or record.get("format") != REGISTRY_FORMAT or record.get("key") != key:
+            return None
+        return RegisteredModel.from_record(record)
+
+    def get(self, key):
+        """Return the latest model stored under ``key`` regardless of fingerprint."""
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            self.loads += 1
+            self._remember(entry)
+        return entry
+
+    def lookup(self, key, values, spec):
+        """Return the model for ``key`` if it was fitted on exactly ``values``."""
+        entry = self.get(key)
+        if entry is not None and entry.fingerprint == fingerprint(values, spec):
+            self.hits += 1
+            return entry
+        return None
+
+    def adopt(self, entry):
+        """Keep a model fitted elsewhere (e.g. in a pool worker) in memory."""
+        self._remember(entry)
+        return entry
+
+    def get_or_fit(self, key, values, fit, spec):
+        """Return the model for ``key``, refitting only if the data changed.
+
+        ``fit(values)`` returns a fitted model; ``spec`` describes the model
+        configuration and is part of the fingerprint.
+        """
+        fp = fingerprint(values, spec)
+        entry = self.get(key)
+        if entry is not None and entry.fingerprint == fp:
+            self.hits += 1
+            return entry
+
+        version = entry.version + 1 if entry is not None else 1
+        entry = RegisteredModel(key, fp, version, fit(values))
+        self.fits += 1
+        self._remember(entry)
+        self.save(entry)
+        return entry
+
+    def save(self, entry):
+        try:
+            self.store.save(entry.key, entry.to_record())
+        except Exception as e:
+            # The in-memory copy still serves requests; it is refitted after a restart
+            logger.warning("Could not persist model %s: %s", entry.key, e)
+
+    def stats(self):
+        return {
+            "backend": type(self.store).__name__,
+            "cached_models": len(self._models),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "loads": self.loads,
+            "fits": self.fits,
+        }
+
+
+registry = ModelRegistry(PostgresStore() if MODEL_REGISTRY_BACKEND == "postgres" else DiskStore())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, JSON, Date, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, String, Float, JSON, Date, ForeignKey, DateTime, LargeBinary, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import uuid
@@ -16,6 +16,8 @@ class User(Base):
 
 class Prediction(Base):
     __tablename__ = "predictions"
+    # Keyset pagination of a user's history, newest first
+    __table_args__ = (Index("ix_predictions_user_created", "user_id", "created_at", "id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
@@ -33,13 +35,40 @@ class Prediction(Base):
 
 class Forecast(Base):
     __tablename__ = "forecasts"
+    __table_args__ = (Index("ix_forecasts_user_created", "user_id", "created_at"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     prediction_id = Column(UUID(as_uuid=True), ForeignKey("predictions.id"))
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    device_id = Column(String, index=True)
     consumption = Column(Float)
     trend = Column(String)
     percentage_change = Column(Float)
     created_at = Column(DateTime, server_default=func.now())
 
-    prediction = relationship("Prediction", back_populates="forecasts")
\ No newline at end of file
+    prediction = relationship("Prediction", back_populates="forecasts")
+
+class FittedModel(Base):
+    __tablename__ = "fitted_models"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    version = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class DeviceReading(Base):
+    # Managed by Supabase; mapped here for bulk loads and queries
+    __tablename__ = "device_data"
+    __table_args__ = (Index("ix_device_data_device_timestamp", "device_id", "timestamp"),)
+
+    # SQLite only autoincrements INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    device_id = Column(String, default="default")
+    temperature = Column(Float)
+    humidity = Column(Float)
+    voltage = Column(Float)
+    current = Column(Float)
+    power = Column(Float)
+    energy = Column(Float)
+    timestamp = Column(String)
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+Streaming quality checks for device readings on the /device-data path.
+
+Every reading is checked in one pass against running statistics of its
+device, without reading the database:
+
+``range``
+    A value is missing, not finite or outside ``LIMITS``.
+``timestamp``
+    The timestamp is not ISO 8601.  It is left out of the ordering state.
+``spike``
+    A value is more than ``QUALITY_Z`` standard deviations (Welford, over
+    the device's accepted readings) away from its EWMA, once the device has
+    sent ``QUALITY_WARMUP`` readings.  Spikes are left out of the Welford
+    statistics so one outlier does not widen the band for the next.
+``stuck``
+    A non-zero value repeated ``QUALITY_STUCK_RUN`` times in a row.
+``energy_reset``
+    The cumulative ``energy`` counter went down.
+``out_of_order``
+    The timestamp is not after the device's previous reading.
+
+Issues of the kinds in ``QUALITY_QUARANTINE`` (``range`` and ``timestamp``
+by default) keep the reading out of storage and the live view; the rest are
+only flagged.  Either way an event is recorded and served by ``/device-data/quality/events``.
+
+State is a set of preallocated ``(QUALITY_MAX_DEVICES, len(FIELDS))``
+arrays with one row per device, about 300 bytes per device.  Devices
+beyond the limit reuse the row of the least recently seen one.
+"""
+import os
+from collections import OrderedDict, deque
+from collections import Counter as Tally
+from itertools import islice
+
+import numpy as np
+
+from live import FIELDS, parse_epoch
+
+QUALITY_MAX_DEVICES = int(os.getenv("QUALITY_MAX_DEVICES", "10000"))
+QUALITY_WARMUP = int(os.getenv("QUALITY_WARMUP", "30"))
+QUALITY_Z = float(os.getenv("QUALITY_Z", "6"))
+QUALITY_EWMA_ALPHA = float(os.getenv("QUALITY_EWMA_ALPHA", "0.1"))
+QUALITY_STUCK_RUN = int(os.getenv("QUALITY_STUCK_RUN", "60"))
+QUALITY_EVENTS = int(os.getenv("QUALITY_EVENTS", "10000"))
+QUALITY_QUARANTINE = {kind for kind in os.getenv("QUALITY_QUARANTINE", "range,timestamp").split(",") if kind}
+
+# Physically plausible bounds per field
+LIMITS = {
+    "power": (0, 25000),
+    "voltage": (0, 500),
+    "current": (0, 200),
+    "energy": (0, float("inf")),
+    "temperature": (-40, 85),
+    "humidity": (0, 100),
+}
+
+ENERGY = FIELDS.index("energy")
+_LOW = np.array([LIMITS[f][0] for f in FIELDS], dtype=float)
+_HIGH = np.array([LIMITS[f][1] for f in FIELDS], dtype=float)
+# energy is a counter; it gets the reset check instead of spike and stuck checks
+_GAUGES = np.array([f != "energy" for f in FIELDS])
+
+
+class QualityMonitor:
+    def __init__(self, max_devices=QUALITY_MAX_DEVICES, warmup=QUALITY_WARMUP, z=QUALITY_Z,
+                 alpha=QUALITY_EWMA_ALPHA, stuck_run=QUALITY_STUCK_RUN, max_events=QUALITY_EVENTS,
+                 quarantine=QUALITY_QUARANTINE):
+        self.max_devices = max_devices
+        self.warmup = warmup
+        self.z = z
+        self.alpha = alpha
+        self.stuck_run = stuck_run
+        self.quarantine = quarantine
+        shape = (max_devices, len(FIELDS))
+        self.count = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.ewma = np.zeros(shape)
+        self.last = np.zeros(shape)
+        self.run = np.zeros(shape)
+        self._rows = (self.count, self.mean, self.m2, self.ewma, self.last, self.run)
+        self.seen = np.zeros(max_devices, dtype=np.int64)
+        self.last_timestamp = np.zeros(max_devices)
+        self.checked = 0
+        self.quarantined = 0
+        self.kinds = Tally()
+        self.events = deque(maxlen=max_events)
+        self.sequence = 0
+        self._slots = OrderedDict()
+
+    def _slot(self, device_id):
+        slot = self._slots.get(device_id)
+        if slot is not None:
+            self._slots.move_to_end(device_id)
+            return slot
+        if len(self._slots) < self.max_devices:
+            slot = len(self._slots)
+        else:
+            _, slot = self._slots.popitem(last=False)
+            for state in self._rows:
+                state[slot] = 0
+            self.seen[slot] = 0
+            self.last_timestamp[slot] = 0
+        self._slots[device_id] = slot
+        return slot
+
+    def check(self, reading):
+        """Check and record one reading; returns its events (usually none)."""
+        device_id = reading.get("device_id", "default")
+        values = np.array([reading[f] if reading.get(f) is not None else np.nan for f in FIELDS], dtype=float)
+        timestamp = parse_epoch(reading.get("timestamp"))
+        slot = self._slot(device_id)
+        self.checked += 1
+        issues = []
+
+        # NaN fails both comparisons; energy has no upper limit to stop inf
+        out_of_range = ~((values >= _LOW) & (values <= _HIGH) & np.isfinite(values))
+        if out_of_range.any():
+            issues += [("range", i, None) for i in np.flatnonzero(out_of_range)]
+
+        seen = self.seen[slot]
+        if timestamp is None:
+            issues.append(("timestamp", None, None))
+        elif seen and timestamp <= self.last_timestamp[slot]:
+            issues.append(("out_of_order", None, None))
+
+        if self.quarantine.isdisjoint(kind for kind, _, _ in issues):
+            count, mean, ewma, last, run = (self.count[slot], self.mean[slot], self.ewma[slot],
+                                            self.last[slot], self.run[slot])
+            spikes = np.zeros(len(FIELDS), dtype=bool)
+            band = np.inf
+            if seen >= self.warmup:
+                std = np.sqrt(self.m2[slot] / np.maximum(count - 1, 1))
+                # Floor the band so near-constant sensors do not flag rounding noise
+                band = self.z * np.maximum(std, 1e-3 * np.abs(mean) + 1e-9)
+                spikes = _GAUGES & (np.abs(values - ewma) > band)
+                if spikes.any():
+                    issues += [("spike", i, ewma[i]) for i in np.flatnonzero(spikes)]
+            if seen:
+                run[:] = np.where(values == last, run + 1, 0)
+                stuck = _GAUGES & (run == self.stuck_run - 1) & (values != 0)
+                if stuck.any():
+                    issues += [("stuck", i, last[i]) for i in np.flatnonzero(stuck)]
+                if values[ENERGY] < last[ENERGY]:
+                    issues.append(("energy_reset", ENERGY, last[ENERGY]))
+                # Spikes pull the EWMA only as far as the band edge
+                ewma += self.alpha * (np.clip(values, ewma - band, ewma + band) - ewma)
+            else:
+                ewma[:] = values
+
+            # Welford update of the accepted (non-spike) values
+            accepted = ~spikes
+            count += accepted
+            delta = np.where(accepted, values - mean, 0)
+            mean += delta / np.maximum(count, 1)
+            self.m2[slot] += delta * (values - mean)
+            last[:] = values
+            self.seen[slot] = seen + 1
+            if timestamp is not None:
+                self.last_timestamp[slot] = max(timestamp, self.last_timestamp[slot])
+
+        if not issues:
+            return []
+        return self._record(reading, device_id, values, issues)
+
+    def _record(self, reading, device_id, values, issues):
+        quarantined = not self.quarantine.isdisjoint(kind for kind, _, _ in issues)
+        self.quarantined += quarantined
+        events = []
+        for kind, field, expected in issues:
+            self.sequence += 1
+            self.kinds[kind] += 1
+            event = {
+                "seq": self.sequence,
+                "device_id": device_id,
+                "timestamp": reading.get("timestamp"),
+                "kind": kind,
+                "field": FIELDS[field] if field is not None else None,
+                "value": float(values[field]) if field is not None else None,
+                "expected": float(expected) if expected is not None else None,
+                "action": "quarantine" if quarantined else "flag",
+            }
+            events.append(event)
+            # Quarantined readings are only kept here
+            self.events.append({**event, "reading": reading} if quarantined else event)
+        return events
+
+    def events_since(self, since=0, limit=100, device_id=None):
+        """Up to ``limit`` events after sequence number ``since``, oldest first."""
+        first = self.events[0]["seq"] if self.events else self.sequence + 1
+        events = islice(self.events, max(since - first + 1, 0), None)
+        if device_id is not None:
+            events = (event for event in events if event["device_id"] == device_id)
+        events = list(islice(events, limit))
+        return events, events[-1]["seq"] if events else since
+
+    def stats(self):
+        return {
+            "devices": len(self._slots),
+            "max_devices": self.max_devices,
+            "bytes_per_device": sum(state.itemsize * len(FIELDS) for state in self._rows) + 16,
+            "checked": self.checked,
+            "quarantined": self.quarantined,
+            "events": dict(self.kinds),
+            "quarantine_kinds": sorted(self.quarantine),
+        }
+
+
+monitor = QualityMonitor()
@@ -0,0 +1,75 @@
+"""
+Async data access for device readings and prediction history.
+
+Readings are inserted from lists of row dicts as one executemany per call,
+which SQLAlchemy batches into multi-row INSERTs.
+
+Prediction history is paginated by keyset on ``(created_at, id)`` within a
+user, using the ``ix_predictions_user_created`` index, so every page is an
+index range scan of ``limit`` rows regardless of how many predictions the
+user has.
+"""
+import base64
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert, select, tuple_
+
+from models import DeviceReading, Prediction
+
+HISTORY_COLUMNS = [
+    "id", "user_id", "appliances", "start_date", "end_date", "consumption",
+    "days", "total_appliances", "time_series_predictions", "created_at",
+]
+
+
+def encode_cursor(created_at, id):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of :func:`encode_cursor`; raises ValueError on malformed input."""
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _serialize(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class Repository:
+    def __init__(self, session):
+        self.session = session
+
+    async def add_readings(self, rows):
+        # device_data ids come from the database sequence
+        if rows:
+            await self.session.execute(insert(DeviceReading.__table__), rows)
+
+    async def prediction_page(self, user_id, limit, after=None):
+        """One page of a user's predictions, newest first.
+
+        ``after`` is a decoded cursor from the previous page.  Returns
+        ``(items, next_cursor)``; ``next_cursor`` is None on the last page.
+        """
+        columns = [getattr(Prediction, column) for column in HISTORY_COLUMNS]
+        stmt = select(*columns).where(Prediction.user_id == user_id)
+        if after is not None:
+            stmt = stmt.where(tuple_(Prediction.created_at, Prediction.id) < tuple_(*after))
+        # One extra row tells whether another page follows
+        stmt = stmt.order_by(Prediction.created_at.desc(), Prediction.id.desc()).limit(limit + 1)
+        rows = (await self.session.execute(stmt)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        items = [{column: _serialize(value) for column, value in zip(HISTORY_COLUMNS, row)} for row in rows]
+        return items, next_cursor
@@ -0,0 +1,130 @@
+"""
+Startup sequencing and cold-start report for the API process.
+
+Before the server starts listening, the lifespan hook only creates the
+Supabase client and starts ingestion.  :func:`warm_up` then runs in the
+background: it imports statsforecast, runs a synthetic forecast so numba
+compiles the model kernels, times each model for latency budgets
+(see ``model_ladder.py``), starts the forecast pool (whose workers do the
+same) and fills the unit forecast tables.  ``/health`` answers as soon as the
+process is up; ``/ready`` answers 503 until the warmup has finished, so the
+platform only routes traffic to warm instances.
+
+forecast_engine sets ``NIXTLA_NUMBA_CACHE`` so numba keeps compiled kernels
+in ``NUMBA_CACHE_DIR``, and after the first boot the JIT phase loads them
+from disk (``numba_cached_functions`` in the report counts them).  Running
+
+    python startup.py
+
+at build time fills the cache before the first deploy.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Wall-clock seconds spent in each startup phase."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.ready_after = None
+        self.error = None
+        self._last = self.started
+        self._ready = asyncio.Event()
+
+    def mark(self, name):
+        """Record the time since the previous phase ended as ``name``."""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._last = time.perf_counter()
+            self.phases[name] = self._last - started
+
+    @property
+    def ready(self):
+        return self._ready.is_set() and self.error is None
+
+    def set_ready(self, error=None):
+        self.error = error
+        self.ready_after = time.perf_counter() - self.started
+        self._ready.set()
+
+    async def wait(self):
+        """Wait until the warmup has finished (successfully or not)."""
+        await self._ready.wait()
+
+    def stats(self):
+        from forecast_engine import NUMBA_CACHE_DIR
+
+        cached = 0
+        for _, _, files in os.walk(NUMBA_CACHE_DIR):
+            cached += sum(name.endswith(".nbi") for name in files)
+        return {
+            "ready": self.ready,
+            "ready_after_seconds": self.ready_after,
+            "phases": self.phases,
+            "numba_cache_dir": NUMBA_CACHE_DIR,
+            "numba_cached_functions": cached,
+            "error": self.error,
+        }
+
+
+report = StartupReport()
+
+
+def load_models():
+    """Import statsforecast and compile its kernels in this process."""
+    from forecast_engine import warm_up as warm_up_models
+    from model_ladder import ladder
+
+    with report.phase("models_import"):
+        importlib.import_module("statsforecast.models")
+    with report.phase("jit"):
+        warm_up_models()
+    # Seed the fit-time estimates behind latency budgets
+    with report.phase("calibrate"):
+        ladder.calibrate()
+
+
+async def warm_up():
+    from forecast_engine import FORECAST_PRECOMPUTE, engines
+    from forecast_executor import forecast_executor
+
+    try:
+        await asyncio.to_thread(load_models)
+        with report.phase("workers"):
+            await forecast_executor.start()
+        # Fill every model's unit forecast table before reporting ready
+        if FORECAST_PRECOMPUTE:
+            with report.phase("precompute"):
+                for engine in engines.values():
+                    await asyncio.to_thread(engine.precompute)
+    except Exception as e:
+        logger.exception("Warmup failed")
+        report.set_ready(str(e))
+    else:
+        report.set_ready()
+        logger.info("Ready after %.2fs: %s", report.ready_after,
+                    ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report.phases.items()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)-5.5s [%(name)s] %(message)s")
+    load_models()
+    report.set_ready()
+    print(json.dumps(report.stats(), indent=2))
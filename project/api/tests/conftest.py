@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+import pytest
+
+# Read at import time by the API modules: forecast on a background thread,
+# skip precomputing the unit tables and keep fitted models and the database
+# out of the repo (and away from any DATABASE_URL in .env)
+_tmp = tempfile.mkdtemp(prefix="ecotrack-test-")
+os.environ.setdefault("FORECAST_WORKERS", "0")
+os.environ.setdefault("FORECAST_PRECOMPUTE", "0")
+os.environ.setdefault("MODEL_REGISTRY_DIR", os.path.join(_tmp, "models"))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.pop("FLEET_FORECAST_AT", None)
+
+
+# Session-scoped so module-scoped async fixtures can share one app
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import device_forecast
+from device_forecast import DeviceForecaster, InsufficientHistory
+from model_registry import DiskStore, ModelRegistry
+
+pytestmark = pytest.mark.anyio
+
+
+class InlineExecutor:
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+def history(days):
+    today = pd.Timestamp.now("UTC").tz_convert(None).normalize()
+    index = pd.date_range(end=today, periods=days + 1, freq="D")
+    totals = 10 + 2 * np.sin(np.arange(days + 1) * 2 * np.pi / 7)
+    counter = np.cumsum(totals)
+    return pd.DataFrame({"min_energy": counter - totals, "max_energy": counter}, index=index)
+
+
+@pytest.fixture
+def devices(monkeypatch, tmp_path):
+    registry = ModelRegistry(DiskStore(str(tmp_path)))
+    monkeypatch.setattr(device_forecast, "registry", registry)
+    daily = {"d1": history(21), "d2": history(21), "short": history(3)}
+    monkeypatch.setattr(device_forecast.device_series, "daily_energy", lambda device_id, start=None: daily[device_id])
+    return registry
+
+
+async def test_forecast_is_cached_until_stale(devices):
+    forecaster = DeviceForecaster(InlineExecutor())
+    first = await forecaster.forecast("d1", 7)
+    assert not first["cached"] and len(first["predictions"]) == 7
+    second = await forecaster.forecast("d1", 7)
+    assert second["cached"]
+    assert list(second["predictions"]) == list(first["predictions"])
+    assert forecaster.stats()["refits"] == 1
+
+
+async def test_short_history_is_rejected(devices):
+    with pytest.raises(InsufficientHistory):
+        await DeviceForecaster(InlineExecutor()).forecast("short", 7)
+
+
+async def test_blocking_calls_stay_off_the_event_loop(devices, monkeypatch):
+    loop_thread = threading.get_ident()
+    threads = []
+    lookup, predict = devices.lookup, device_forecast.predict_model
+
+    def record(fn):
+        def wrapper(*args):
+            threads.append(threading.get_ident())
+            return fn(*args)
+        return wrapper
+
+    monkeypatch.setattr(devices, "lookup", record(lookup))
+    monkeypatch.setattr(device_forecast, "predict_model", record(predict))
+    await DeviceForecaster(InlineExecutor()).forecast("d1", 7)
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+async def test_state_is_bounded(devices):
+    forecaster = DeviceForecaster(InlineExecutor(), max_devices=1)
+    await forecaster.forecast("d1", 7)
+    await forecaster.forecast("d2", 7)
+    stats = forecaster.stats()
+    assert (stats["devices"], stats["evictions"]) == (1, 1)
+    assert list(forecaster._locks) == ["d2"]
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert
+
+import database
+import device_series
+from database import Base
+from device_series import lttb, parse_bound
+from models import DeviceReading
+
+
+def test_lttb_keeps_short_series():
+    x = np.arange(10, dtype=float)
+    assert list(lttb(x, x, 10)) == list(range(10))
+    assert list(lttb(x, x, 20)) == list(range(10))
+
+
+def test_lttb_keeps_endpoints_and_order():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    indices = lttb(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[[123, 456, 789]] = [50.0, -50.0, 80.0]
+    indices = lttb(x, y, 50)
+    assert {123, 456, 789} <= set(indices.tolist())
+
+
+def test_parse_bound():
+    assert parse_bound(None) is None
+    assert parse_bound("1704067200") == parse_bound("2024-01-01T00:00:00Z")
+    assert parse_bound("2024-01-01") == parse_bound("2024-01-01T00:00:00+00:00")
+
+
+@pytest.fixture
+def readings(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'series.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(database, "engine", engine)
+
+    def add(rows):
+        defaults = {"device_id": "d1", "temperature": 20.0, "humidity": 40.0, "voltage": 230.0, "current": 1.0}
+        with engine.begin() as conn:
+            conn.execute(insert(DeviceReading.__table__), [{**defaults, **row} for row in rows])
+    return add
+
+
+def test_aggregates_cover_ranges_beyond_the_raw_row_cap(monkeypatch, readings):
+    monkeypatch.setattr(device_series, "SERIES_MAX_RAW_ROWS", 10)
+    # Three readings an hour for two days, energy counting up
+    readings([
+        {"timestamp": f"2024-01-{1 + hour // 24:02d}T{hour % 24:02d}:{minute:02d}:00Z",
+         "power": float(hour), "energy": float(3 * hour + minute // 20)}
+        for hour in range(48) for minute in (0, 20, 40)
+    ])
+    series = device_series.query_series("d1", resolution="hour", points=1000)
+    assert series["points"] == 48
+    assert series["timestamps"][0] == np.datetime64("2024-01-01T00:00:00")
+    assert list(series["power"]) == list(range(48))
+    # Highest counter reading in each bucket, as on Postgres
+    assert list(series["energy"]) == [3.0 * hour + 2 for hour in range(48)]
+
+    daily = device_series.query_series("d1", resolution="day", points=1000)
+    assert list(daily["energy"]) == [71.0, 143.0]
+    assert list(daily["power"]) == [11.5, 35.5]
+
+
+def test_buckets_are_utc(readings):
+    readings([
+        {"timestamp": "2024-01-02T01:30:00+02:00", "power": 1.0, "energy": 1.0},
+        {"timestamp": "2024-01-01T23:45:00.500000Z", "power": 3.0, "energy": 2.0},
+    ])
+    series = device_series.query_series("d1", resolution="hour", points=1000)
+    assert list(series["timestamps"]) == [np.datetime64("2024-01-01T23:00:00")]
+    assert list(series["power"]) == [2.0]
+    assert series["next_since"] == "2024-01-01T23:00:00Z"
+
+
+def test_daily_energy_many(readings):
+    readings([
+        {"device_id": device, "timestamp": f"2024-01-0{day}T{hour:02d}:00:00Z", "power": 1.0, "energy": energy}
+        for device, offset in (("a", 0.0), ("b", 100.0))
+        for day in (1, 2)
+        for hour, energy in ((1, offset + day), (12, offset + day * 10))
+    ])
+    daily = device_series.daily_energy_many(["a", "b"], start="2024-01-02")
+    assert daily.to_dict("records") == [
+        {"device_id": "a", "day": np.datetime64("2024-01-02"), "min_energy": 2.0, "max_energy": 20.0},
+        {"device_id": "b", "day": np.datetime64("2024-01-02"), "min_energy": 102.0, "max_energy": 120.0},
+    ]
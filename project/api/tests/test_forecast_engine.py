@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import forecast_engine
+from forecast_engine import ForecastEngine
+from model_registry import DiskStore, ModelRegistry
+
+BASE = [float(v) for v in range(100, 121)]
+
+
+class FakeModels:
+    """Forecasts the mean of the history, plus ``offset`` (which breaks scaling)."""
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.fits = 0
+        self.refits = []
+
+    def fit_model(self, values, model):
+        self.fits += 1
+        return float(np.mean(values))
+
+    def predict_model(self, mean, horizon):
+        return np.full(horizon, mean + self.offset)
+
+    def fit_forecast(self, values, horizon, model):
+        self.refits.append(float(values[0]))
+        return self.predict_model(float(np.mean(values)), horizon)
+
+
+@pytest.fixture
+def models(monkeypatch, tmp_path):
+    registry = ModelRegistry(DiskStore(str(tmp_path)))
+    monkeypatch.setattr(forecast_engine, "registry", registry)
+
+    def install(offset=0.0):
+        models = FakeModels(offset)
+        for name in ("fit_model", "predict_model", "fit_forecast"):
+            monkeypatch.setattr(forecast_engine, name, getattr(models, name))
+        return models
+    return install
+
+
+def test_scalable_prefix_is_served_from_the_table(models):
+    fake = models()
+    engine = ForecastEngine(BASE, horizon=30)
+    predictions = engine.forecast(10, 5, 3.0)
+    assert predictions == pytest.approx(np.full(5, np.mean(BASE[:10]) * 3.0))
+    # Verified once against a direct refit per check scale
+    assert len(fake.refits) == len(forecast_engine.VERIFY_SCALES)
+    engine.forecast(10, 30, 0.5)
+    assert len(fake.refits) == len(forecast_engine.VERIFY_SCALES)
+    assert engine.stats()["unscalable_prefixes"] == []
+    assert engine.cached(10, 30) and not engine.cached(10, 31)
+
+
+def test_unscalable_prefix_is_refit_per_request(models):
+    fake = models(offset=1.0)
+    engine = ForecastEngine(BASE, horizon=30)
+    predictions = engine.forecast(10, 5, 3.0)
+    # The direct fit of the scaled history, not the scaled table entry
+    assert predictions == pytest.approx(np.full(5, np.mean(BASE[:10]) * 3.0 + 1.0))
+    assert engine.stats()["unscalable_prefixes"] == [10]
+    assert not engine.cached(10, 5)
+    refits = len(fake.refits)
+    engine.forecast(10, 5, 2.0)
+    assert fake.refits[refits:] == [BASE[0] * 2.0]
+
+
+def test_verify_reports_relative_error(models):
+    models(offset=1.0)
+    engine = ForecastEngine(BASE, horizon=30)
+    mean = np.mean(BASE[:10])
+    assert engine.verify(10, 5, 2.0) == pytest.approx(1.0 / (2 * mean + 1))
+    assert not engine.scalable(10)
+
+
+@pytest.mark.parametrize("offset, unscalable", [(0.0, []), (1.0, [10])])
+def test_verification_outcome_survives_restarts(models, offset, unscalable):
+    fake = models(offset)
+    ForecastEngine(BASE, horizon=30).forecast(10, 5, 1.0)
+    # A new engine (e.g. after a restart) loads the model and its verdict
+    refits, fits = len(fake.refits), fake.fits
+    engine = ForecastEngine(BASE, horizon=30)
+    engine.forecast(10, 5, 1.0)
+    assert fake.fits == fits
+    assert engine.stats()["unscalable_prefixes"] == unscalable
+    assert len(fake.refits) - refits == len(unscalable)
+
+
+def test_longer_horizon_refits_with_double_capacity(models):
+    models()
+    engine = ForecastEngine(BASE, horizon=10)
+    engine.forecast(10, 5, 1.0)
+    engine.forecast(10, 15, 1.0)
+    assert len(engine.entry(10)[0]) == 20
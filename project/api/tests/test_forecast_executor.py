@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+import forecast_executor
+import main
+from forecast_executor import ExecutorBusy, ForecastExecutor, ForecastTimeout
+
+pytestmark = pytest.mark.anyio
+
+
+def square(x):
+    return x * x
+
+
+@pytest.fixture
+async def executor(monkeypatch):
+    # One thread worker without the model warmup
+    monkeypatch.setattr(forecast_executor, "warm_up", lambda: None)
+    executor = ForecastExecutor(workers=0, queue_size=1, timeout=0.2)
+    await executor.start()
+    yield executor
+    executor.shutdown()
+
+
+async def test_runs_jobs(executor):
+    assert await executor.run(square, 4) == 16
+    assert executor.stats()["completed"] == 1
+
+
+async def test_rejects_when_queue_is_full(executor):
+    running = asyncio.ensure_future(executor.run(time.sleep, 0.1))
+    await asyncio.sleep(0.01)
+    waiting = asyncio.ensure_future(executor.run(square, 2))
+    await asyncio.sleep(0.01)
+    with pytest.raises(ExecutorBusy):
+        await executor.run(square, 3)
+    assert executor.stats()["rejected"] == 1
+    await running
+    assert await waiting == 4
+
+
+async def test_times_out_waiting_for_a_worker(executor):
+    running = asyncio.ensure_future(executor.run(time.sleep, 0.4))
+    await asyncio.sleep(0.01)
+    with pytest.raises(ForecastTimeout, match="waited"):
+        await executor.run(square, 2)
+    with pytest.raises(ForecastTimeout, match="did not finish"):
+        await running
+    assert executor.stats()["timeouts"] == 2
+
+
+async def test_slot_is_held_until_timed_out_job_finishes(executor):
+    with pytest.raises(ForecastTimeout, match="did not finish"):
+        await executor.run(time.sleep, 0.3)
+    assert executor.stats()["timeouts"] == 1
+    # The worker is still busy, so the slot stays taken
+    assert executor.stats()["running"] == 1
+    started = time.perf_counter()
+    assert await executor.run(square, 5) == 25
+    assert time.perf_counter() - started >= 0.05
+    assert executor.stats()["running"] == 0
+
+
+async def test_not_started_executor_is_busy():
+    with pytest.raises(ExecutorBusy):
+        await ForecastExecutor(workers=0).run(square, 2)
+
+
+@pytest.mark.parametrize("error, status", [
+    (ExecutorBusy("Forecast queue is full"), 503),
+    (ForecastTimeout("Forecast did not finish"), 504),
+])
+async def test_predict_maps_executor_errors(monkeypatch, error, status):
+    async def ready():
+        pass
+
+    async def forecast_plan(plan, budget_ms=None):
+        raise error
+
+    monkeypatch.setattr(main, "wait_until_ready", ready)
+    monkeypatch.setattr(main, "forecast_plan", forecast_plan)
+    payload = {"appliances": {"tvs": 1}, "start_date": "2024-01-01", "end_date": "2024-01-30"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/predict", json=payload)
+    assert response.status_code == status
+    if status == 503:
+        assert response.headers["retry-after"] == str(forecast_executor.FORECAST_RETRY_AFTER)
+
+
+async def test_batch_forecasts_appliance_items_concurrently(monkeypatch):
+    in_flight = []
+
+    async def ready():
+        pass
+
+    async def forecast_plan(plan, budget_ms=None):
+        in_flight.append(plan["days"])
+        # Only returns once every item has started
+        while len(in_flight) < 3:
+            await asyncio.sleep(0.01)
+        if plan["days"] == 20:
+            raise ValueError("no model")
+        return np.ones(plan["future_days"]), "mstl", None
+
+    monkeypatch.setattr(main, "wait_until_ready", ready)
+    monkeypatch.setattr(main, "forecast_plan", forecast_plan)
+    items = [{"appliances": {"tvs": 1}, "start_date": "2024-01-01", "end_date": f"2024-01-{days}"}
+             for days in (10, 20, 30)]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await asyncio.wait_for(client.post("/predict/batch", json={"items": items}), 5)
+    body = response.json()
+    assert response.status_code == 200
+    assert [result["status"] for result in body["results"]] == ["success", "error", "success"]
+    assert body["results"][1]["error"] == "Invalid input: no model"
@@ -0,0 +1,182 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from ingestion import IngestBusy, IngestionPipeline, MemorySink, normalize_timestamp, normalize_timestamps
+
+
+def reading(i):
+    return {"device_id": "d1", "power": float(i), "timestamp": f"2024-01-01T00:00:{i:02d}Z"}
+
+
+class FlakySink(MemorySink):
+    """Fails the first ``failures`` writes."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    async def write(self, rows):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("sink unavailable")
+        await super().write(rows)
+
+
+class BlockingSink(MemorySink):
+    """Holds every write until ``release`` is set, tracking concurrent writes."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.active = 0
+        self.max_active = 0
+
+    async def write(self, rows):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await self.release.wait()
+            await super().write(rows)
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.anyio
+async def test_flushes_full_batches():
+    sink = MemorySink()
+    pipeline = IngestionPipeline(sink, batch_size=5, flush_interval=60)
+    await pipeline.start()
+    for i in range(10):
+        pipeline.submit(reading(i))
+    for _ in range(100):
+        if len(sink.rows) == 10:
+            break
+        await asyncio.sleep(0.01)
+    assert [len(batch) for batch in sink.batches] == [5, 5]
+    assert sink.rows == [reading(i) for i in range(10)]
+    await pipeline.stop()
+
+
+@pytest.mark.anyio
+async def test_flushes_partial_batch_after_interval():
+    sink = MemorySink()
+    pipeline = IngestionPipeline(sink, batch_size=100, flush_interval=0.05)
+    await pipeline.start()
+    for i in range(3):
+        pipeline.submit(reading(i))
+    await asyncio.sleep(0.3)
+    assert [len(batch) for batch in sink.batches] == [3]
+    await pipeline.stop()
+
+
+@pytest.mark.anyio
+async def test_stop_flushes_queued_readings():
+    sink = MemorySink()
+    pipeline = IngestionPipeline(sink, batch_size=100, flush_interval=60)
+    await pipeline.start()
+    for i in range(7):
+        pipeline.submit(reading(i))
+    await pipeline.stop()
+    assert len(sink.rows) == 7
+    assert pipeline.stats()["written"] == 7
+
+
+@pytest.mark.anyio
+async def test_caps_batches_in_flight():
+    sink = BlockingSink()
+    pipeline = IngestionPipeline(sink, batch_size=1, flush_interval=60, max_in_flight=2)
+    await pipeline.start()
+    for i in range(5):
+        pipeline.submit(reading(i))
+    await asyncio.sleep(0.05)
+    assert sink.active == 2
+    assert pipeline.stats()["queue_depth"] == 2
+    sink.release.set()
+    await pipeline.stop()
+    assert sink.max_active == 2
+    assert len(sink.rows) == 5
+
+
+@pytest.mark.anyio
+async def test_retries_failed_writes():
+    sink = FlakySink(failures=2)
+    pipeline = IngestionPipeline(sink, batch_size=10, flush_interval=60, max_retries=3, retry_backoff=0)
+    await pipeline.start()
+    for i in range(4):
+        pipeline.submit(reading(i))
+    await pipeline.stop()
+    assert len(sink.rows) == 4
+    assert pipeline.retries == 2
+    assert pipeline.dropped == 0
+
+
+@pytest.mark.anyio
+async def test_drops_batch_after_max_retries():
+    sink = FlakySink(failures=10)
+    pipeline = IngestionPipeline(sink, batch_size=10, flush_interval=60, max_retries=2, retry_backoff=0)
+    await pipeline.start()
+    for i in range(4):
+        pipeline.submit(reading(i))
+    await pipeline.stop()
+    assert sink.rows == []
+    assert sink.attempts == 3
+    assert pipeline.dropped == 4
+
+
+@pytest.mark.anyio
+async def test_rejects_readings_when_queue_is_full():
+    pipeline = IngestionPipeline(MemorySink(), queue_size=2)
+    await pipeline.start()
+    pipeline.submit(reading(0))
+    pipeline.submit(reading(1))
+    with pytest.raises(IngestBusy):
+        pipeline.submit(reading(2))
+    assert pipeline.rejected == 1
+    await pipeline.stop()
+
+
+TIMESTAMPS = [
+    1704067200, "1704067200", 1704067200.5, "2024-01-01T00:00:00Z", -86400, "-86400.25", "0.0000005",
+    # Invalid: text, missing, milliseconds (out of range as seconds), NaN, booleans, exponents
+    "not-a-time", None, "1704067200000", 1e20, float("nan"), True, "1e3", "",
+]
+
+
+def test_normalize_timestamp():
+    assert [normalize_timestamp(ts) for ts in TIMESTAMPS] == [
+        "2024-01-01T00:00:00Z", "2024-01-01T00:00:00Z", "2024-01-01T00:00:00.500000Z", "2024-01-01T00:00:00Z",
+        "1969-12-31T00:00:00Z", "1969-12-30T23:59:59.750000Z", "1970-01-01T00:00:00Z",
+    ] + [None] * 8
+
+
+def test_normalize_timestamps_matches_scalar_version():
+    timestamps = pd.Series(TIMESTAMPS)
+    assert normalize_timestamps(timestamps).tolist() == [normalize_timestamp(ts) for ts in TIMESTAMPS]
+    # Numeric and string columns, as parsed from NDJSON and CSV
+    assert normalize_timestamps(pd.Series([1704067200, -0.5])).tolist() == [
+        "2024-01-01T00:00:00Z", "1969-12-31T23:59:59.500000Z",
+    ]
+    assert normalize_timestamps(pd.Series(["1704067200", "not-a-time"], dtype=str)).tolist() == [
+        "2024-01-01T00:00:00Z", None,
+    ]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("timestamp, status", [("not-a-time", 400), ("-1.5", 200), ("2024-01-01T00:00:00Z", 200)])
+async def test_device_data_applies_the_bulk_timestamp_rule(monkeypatch, timestamp, status):
+    import httpx
+
+    import main
+
+    submitted = []
+    monkeypatch.setattr(main.ingestion, "submit", submitted.append)
+    reading = {"temperature": 20, "humidity": 40, "voltage": 230, "current": 1, "power": 230, "energy": 1,
+               "timestamp": timestamp, "device_id": "ingest-rule"}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/device-data", json=reading)
+    assert response.status_code == status
+    assert [row["timestamp"] for row in submitted] == normalize_timestamps(pd.Series([timestamp])).dropna().tolist()
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import pytest
+
+from live import FIELDS, LiveHub
+
+
+def reading(second, device_id="d1", **values):
+    return {**{field: float(second) for field in FIELDS}, **values,
+            "device_id": device_id, "timestamp": f"2024-01-01T00:00:{second:02d}Z"}
+
+
+def test_recent_returns_last_readings_oldest_first():
+    hub = LiveHub(capacity=4)
+    for second in range(6):
+        assert hub.publish(reading(second))
+    recent = hub.recent("d1")
+    assert recent["points"] == 4
+    assert recent["timestamps"] == [f"2024-01-01T00:00:{second:02d}Z" for second in range(2, 6)]
+    assert recent["power"] == [2.0, 3.0, 4.0, 5.0]
+    assert hub.recent("d1", limit=2)["power"] == [4.0, 5.0]
+    assert hub.recent("unknown") is None
+
+
+def test_readings_without_a_valid_timestamp_are_skipped():
+    hub = LiveHub()
+    hub.publish(reading(0))
+    assert not hub.publish({**reading(1), "timestamp": "garbage"})
+    assert not hub.publish({**reading(2), "timestamp": None})
+    assert hub.recent("d1")["timestamps"] == ["2024-01-01T00:00:00Z"]
+    assert hub.stats()["skipped"] == 2
+
+
+def test_least_recently_updated_device_is_evicted():
+    hub = LiveHub(max_devices=2)
+    for device_id in ("a", "b", "a", "c"):
+        hub.publish(reading(0, device_id))
+    assert hub.recent("b") is None
+    assert hub.recent("a") is not None and hub.recent("c") is not None
+
+
+@pytest.mark.anyio
+async def test_stream_subscribes_only_while_iterated():
+    hub = LiveHub()
+    hub.publish(reading(0))
+    disconnected = asyncio.Event()
+
+    async def is_disconnected():
+        return disconnected.is_set()
+
+    # Never iterated: nothing to clean up
+    hub.stream("d1", is_disconnected)
+    assert hub.stats()["subscribers"] == 0
+
+    stream = hub.stream("d1", is_disconnected)
+    snapshot = await anext(stream)
+    assert snapshot.startswith("event: snapshot")
+    assert hub.stats()["subscribers"] == 1
+    hub.publish(reading(1))
+    event = await anext(stream)
+    assert json.loads(event.split("data: ", 1)[1])["timestamp"] == "2024-01-01T00:00:01Z"
+    disconnected.set()
+    with pytest.raises(StopAsyncIteration):
+        await anext(stream)
+    assert hub.stats()["subscribers"] == 0
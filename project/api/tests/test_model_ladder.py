@@ -0,0 +1,149 @@
+import math
+
+import numpy as np
+import pytest
+
+import main
+import model_ladder
+from model_ladder import ModelLadder
+
+
+class FakeEngine:
+    def __init__(self, cached=False):
+        self.is_cached = cached
+
+    def cached(self, historical_days, horizon):
+        return self.is_cached
+
+    def version(self, historical_days):
+        return None
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    engines = {model: FakeEngine() for model in model_ladder.LADDER}
+    monkeypatch.setattr(model_ladder, "engines", engines)
+    monkeypatch.setattr(main, "engines", engines)
+    return engines
+
+
+@pytest.fixture
+def ladder():
+    # Seconds per table miss, cheapest model first
+    ladder = ModelLadder(budget_ms=None)
+    for model, seconds in (("seasonal_naive", 0.001), ("ets", 0.05), ("mstl", 1.0)):
+        ladder.observe(model, 21, 30, seconds)
+    return ladder
+
+
+def test_estimate_is_none_before_any_observation():
+    assert ModelLadder().estimate("mstl", 21, 30) is None
+
+
+def test_estimate_adds_two_standard_deviations():
+    ladder = ModelLadder(alpha=0.5)
+    ladder.observe("ets", 21, 30, 1.0)
+    assert ladder.estimate("ets", 21, 30) == 1.0
+    ladder.observe("ets", 21, 30, 3.0)
+    # mean 2.0, variance 0.5 * (0 + 0.5 * 2 ** 2) = 1.0
+    assert ladder.estimate("ets", 21, 30) == pytest.approx(4.0)
+
+
+def test_estimate_for_unseen_size_uses_slowest_seen():
+    ladder = ModelLadder()
+    ladder.observe("ets", 7, 30, 0.1)
+    ladder.observe("ets", 21, 30, 0.3)
+    assert ladder.estimate("ets", 1000, 30) == pytest.approx(0.3)
+    assert ladder.estimate("mstl", 1000, 30) is None
+
+
+@pytest.mark.parametrize("model, historical_days, expected", [
+    ("mstl", 3, ["mstl"]),
+    ("mstl", 7, ["mstl", "seasonal_naive"]),
+    ("mstl", 20, ["mstl", "seasonal_naive"]),
+    ("mstl", 21, ["mstl", "ets", "seasonal_naive"]),
+    ("ets", 21, ["ets", "seasonal_naive"]),
+    ("seasonal_naive", 21, ["seasonal_naive"]),
+])
+def test_fallbacks_respect_min_lengths(model, historical_days, expected):
+    assert ModelLadder().fallbacks(model, historical_days) == expected
+
+
+@pytest.mark.parametrize("historical_days", [2, 14, 21])
+def test_without_budget_mstl_is_used(engines, ladder, historical_days):
+    assert ladder.choose(historical_days, 30) == "mstl"
+    assert ladder.downgrades == 0
+
+
+@pytest.mark.parametrize("budget_ms, historical_days, expected", [
+    (2000, 21, "mstl"),
+    (100, 21, "ets"),
+    (10, 21, "seasonal_naive"),
+    (10, 14, "seasonal_naive"),
+    # Nothing cheaper is sound below a week, so the budget is exceeded
+    (10, 3, "mstl"),
+])
+def test_budget_steps_down_on_uncached_tables(engines, ladder, budget_ms, historical_days, expected):
+    assert ladder.choose(historical_days, 30, budget_ms) == expected
+    assert ladder.downgrades == (expected != "mstl")
+
+
+def test_cached_table_is_within_any_budget(engines, ladder):
+    engines["mstl"].is_cached = True
+    assert ladder.choose(21, 30, budget_ms=1) == "mstl"
+
+
+def test_deployment_budget_applies_without_request_budget(engines, ladder):
+    ladder.budget_ms = 10
+    assert ladder.choose(21, 30) == "seasonal_naive"
+
+
+class FakeExecutor:
+    def __init__(self, forecasts):
+        self.forecasts = forecasts
+        self.calls = []
+
+    async def forecast(self, historical_days, horizon, scale_factor, model):
+        self.calls.append(model)
+        forecast = self.forecasts[model]
+        if isinstance(forecast, Exception):
+            raise forecast
+        return np.full(horizon, forecast)
+
+
+def plan(historical_days):
+    return {"historical_days": historical_days, "future_days": 5, "scale_factor": 1.0}
+
+
+@pytest.fixture
+def executor(monkeypatch, engines):
+    def install(forecasts):
+        executor = FakeExecutor(forecasts)
+        monkeypatch.setattr(main, "forecast_executor", executor)
+        monkeypatch.setattr(main, "ladder", ModelLadder(budget_ms=None))
+        return executor
+    return install
+
+
+@pytest.mark.anyio
+async def test_non_finite_forecast_falls_back_to_cheaper_model(executor):
+    fake = executor({"mstl": math.nan, "ets": math.inf, "seasonal_naive": 4.0})
+    predictions, model, _ = await main.forecast_plan(plan(21))
+    assert model == "seasonal_naive"
+    assert list(predictions) == [4.0] * 5
+    assert fake.calls == ["mstl", "ets", "seasonal_naive"]
+
+
+@pytest.mark.anyio
+async def test_failed_forecast_falls_back_to_cheaper_model(executor):
+    executor({"mstl": ValueError("fit failed"), "ets": 3.0, "seasonal_naive": 4.0})
+    _, model, _ = await main.forecast_plan(plan(21))
+    assert model == "ets"
+
+
+@pytest.mark.anyio
+async def test_non_finite_forecast_without_fallback_is_an_error(executor):
+    fake = executor({"mstl": math.nan, "ets": 3.0, "seasonal_naive": 4.0})
+    with pytest.raises(ValueError, match="cannot forecast"):
+        await main.forecast_plan(plan(3))
+    assert fake.calls == ["mstl"]
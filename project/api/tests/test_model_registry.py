@@ -0,0 +1,84 @@
+import pickle
+
+import pytest
+
+import model_registry
+from model_registry import DiskStore, ModelRegistry, RegisteredModel, fingerprint
+
+
+class Fits:
+    """Fit function that counts its calls and returns the call number."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, values):
+        self.calls += 1
+        return self.calls
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DiskStore(str(tmp_path))
+
+
+def test_similar_keys_get_separate_files(store):
+    keys = ["device/a/b", "device/a_b", "device/a b"]
+    for key in keys:
+        store.save(key, {"key": key})
+    assert len({store._path(key) for key in keys}) == 3
+    assert [store.load(key)["key"] for key in keys] == keys
+
+
+def test_unchanged_data_reuses_the_model(store):
+    fit = Fits()
+    registry = ModelRegistry(store)
+    first = registry.get_or_fit("k", [1.0, 2.0], fit, "spec")
+    assert registry.get_or_fit("k", [1.0, 2.0], fit, "spec") is first
+    # A new process loads it from the store
+    assert ModelRegistry(store).get_or_fit("k", [1.0, 2.0], fit, "spec").model == first.model
+    assert fit.calls == 1
+
+
+@pytest.mark.parametrize("values, spec", [([1.0, 3.0], "spec"), ([1.0, 2.0], "other spec")])
+def test_changed_fingerprint_refits_with_a_new_version(store, values, spec):
+    fit = Fits()
+    registry = ModelRegistry(store)
+    registry.get_or_fit("k", [1.0, 2.0], fit, "spec")
+    entry = registry.get_or_fit("k", values, fit, spec)
+    assert (fit.calls, entry.version, entry.model) == (2, 2, 2)
+    assert registry.lookup("k", [1.0, 2.0], "spec") is None
+    assert registry.lookup("k", values, spec) is entry
+
+
+def test_memory_cache_evicts_least_recently_used(store):
+    registry = ModelRegistry(store, capacity=2)
+    for key in ("a", "b"):
+        registry.get_or_fit(key, [1.0], Fits(), "spec")
+    registry.get("a")
+    registry.get_or_fit("c", [1.0], Fits(), "spec")
+    assert list(registry._models) == ["a", "c"]
+    # Evicted models come back from the store
+    assert registry.get("b") is not None
+    assert registry.stats()["loads"] == 1
+
+
+def test_records_of_another_format_are_refitted(store, monkeypatch):
+    fit = Fits()
+    ModelRegistry(store).get_or_fit("k", [1.0], fit, "spec")
+    monkeypatch.setattr(model_registry, "REGISTRY_FORMAT", model_registry.REGISTRY_FORMAT + 1)
+    registry = ModelRegistry(store)
+    assert registry.get("k") is None
+    assert registry.get_or_fit("k", [1.0], fit, "spec").version == 1
+    assert fit.calls == 2
+
+
+def test_unreadable_records_are_refitted(store):
+    store.save("k", RegisteredModel("k", fingerprint([1.0], "spec"), 1, "model").to_record())
+    with open(store._path("k"), "wb") as f:
+        f.write(b"not a pickle")
+    registry = ModelRegistry(store)
+    assert registry.get("k") is None
+    assert registry.get_or_fit("k", [1.0], Fits(), "spec").model == 1
+    with open(store._path("k"), "rb") as f:
+        assert pickle.load(f)["model"] == 1
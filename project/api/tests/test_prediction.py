@@ -0,0 +1,84 @@
+import math
+
+import httpx
+import pytest
+
+import main
+from benchmark import FakeSupabase
+
+pytestmark = pytest.mark.anyio
+
+# Sample appliance mix over a 30-day range
+PAYLOAD = {
+    "appliances": {"tvs": 2, "computers": 1, "refrigerators": 1},
+    "start_date": "2024-01-01",
+    "end_date": "2024-01-30",
+}
+
+
+@pytest.fixture(scope="module")
+async def client():
+    supabase = FakeSupabase()
+    main.create_supabase = lambda: supabase
+    main.supabase = None
+    async with main.lifespan(main.app):
+        await main.report.wait()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+async def test_prediction(client):
+    response = await client.post("/predict", json=PAYLOAD)
+    assert response.status_code == 200
+    result = response.json()
+    historical = result["historical_values"]
+    predictions = result["time_series_predictions"]
+    assert len(historical) == 15
+    assert len(predictions) == 15
+    assert len(result["dates"]) == 30
+    assert all(math.isfinite(value) and value > 0 for value in predictions)
+
+
+async def test_prediction_is_repeatable(client):
+    first = (await client.post("/predict", json=PAYLOAD)).json()
+    second = (await client.post("/predict", json=PAYLOAD)).json()
+    assert second["time_series_predictions"] == pytest.approx(first["time_series_predictions"])
+
+
+async def test_prediction_rejects_single_day(client):
+    response = await client.post("/predict", json={**PAYLOAD, "end_date": PAYLOAD["start_date"]})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("end_date", ["2024-01-02", "2024-01-05", "2024-01-07"])
+async def test_prediction_accepts_short_ranges(client, end_date):
+    response = await client.post("/predict", json={**PAYLOAD, "end_date": end_date})
+    assert response.status_code == 200
+    assert all(math.isfinite(value) for value in response.json()["time_series_predictions"])
+
+
+async def test_prediction_rejects_reversed_range(client):
+    response = await client.post("/predict", json={**PAYLOAD, "start_date": "2024-02-01"})
+    assert response.status_code == 400
+
+
+async def test_batch_matches_single_predictions(client):
+    single = (await client.post("/predict", json=PAYLOAD)).json()
+    response = await client.post("/predict/batch", json={"items": [
+        PAYLOAD,
+        {"values": [float(v) for v in range(1, 29)], "horizon": 7},
+        {"values": [], "horizon": 7},
+    ]})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["succeeded"], result["failed"]) == (2, 1)
+    appliance, series, empty = result["results"]
+    assert appliance["result"]["time_series_predictions"] == pytest.approx(single["time_series_predictions"])
+    assert len(series["result"]["predictions"]) == 7
+    assert empty["status"] == "error"
+
+
+async def test_prediction_history_requires_token(client):
+    response = await client.get("/predictions")
+    assert response.status_code == 401
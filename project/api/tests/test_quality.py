@@ -0,0 +1,132 @@
+from quality import QualityMonitor
+
+NORMAL = {"power": 100.0, "voltage": 230.0, "current": 0.5, "energy": 10.0, "temperature": 21.0, "humidity": 40.0}
+
+
+def reading(second, device_id="d1", **values):
+    return {**NORMAL, **values, "device_id": device_id, "timestamp": f"2024-01-01T00:{second // 60:02d}:{second % 60:02d}Z"}
+
+
+def warm(monitor, device_id="d1", count=30):
+    for second in range(count):
+        assert monitor.check(reading(second, device_id, power=100.0 + second % 3, energy=10.0 + second)) == []
+    return count
+
+
+def kinds(events):
+    return [(event["kind"], event["field"], event["action"]) for event in events]
+
+
+def test_normal_readings_have_no_issues():
+    monitor = QualityMonitor(warmup=10)
+    warm(monitor)
+    assert monitor.stats()["checked"] == 30
+    assert monitor.quarantined == 0
+
+
+def test_out_of_range_values_are_quarantined():
+    monitor = QualityMonitor()
+    events = monitor.check(reading(0, humidity=140.0))
+    assert kinds(events) == [("range", "humidity", "quarantine")]
+    assert monitor.quarantined == 1
+    # Quarantined readings are kept with their event
+    assert monitor.events[-1]["reading"]["humidity"] == 140.0
+
+
+def test_missing_values_are_out_of_range():
+    monitor = QualityMonitor()
+    assert kinds(monitor.check(reading(0, voltage=None))) == [("range", "voltage", "quarantine")]
+
+
+def test_infinite_values_are_out_of_range():
+    monitor = QualityMonitor()
+    monitor.check(reading(0))
+    assert kinds(monitor.check(reading(1, energy=float("inf")))) == [("range", "energy", "quarantine")]
+    # The quarantined value does not become the counter's last value
+    assert monitor.check(reading(2, energy=11.0)) == []
+
+
+def test_unparseable_timestamp_is_quarantined():
+    monitor = QualityMonitor()
+    monitor.check(reading(10))
+    events = monitor.check({**reading(11, energy=11.0), "timestamp": "garbage"})
+    assert kinds(events) == [("timestamp", None, "quarantine")]
+    # Ordering is still judged against the last valid timestamp
+    assert monitor.check(reading(12, energy=12.0)) == []
+
+
+def test_flagged_bad_timestamp_leaves_ordering_state_alone():
+    monitor = QualityMonitor(quarantine={"range"})
+    monitor.check(reading(10))
+    assert kinds(monitor.check({**reading(11, energy=11.0), "timestamp": None})) == [("timestamp", None, "flag")]
+    assert monitor.check(reading(12, energy=12.0)) == []
+
+
+def test_spike_is_flagged_after_warmup():
+    monitor = QualityMonitor(warmup=10)
+    second = warm(monitor)
+    events = monitor.check(reading(second, power=5000.0, energy=100.0))
+    assert kinds(events) == [("spike", "power", "flag")]
+    assert events[0]["expected"] < 110
+    # One spike neither widens the band nor drags the EWMA to keep flagging
+    assert monitor.check(reading(second + 1, power=101.0, energy=101.0)) == []
+
+
+def test_no_spikes_during_warmup():
+    monitor = QualityMonitor(warmup=10)
+    monitor.check(reading(0))
+    assert monitor.check(reading(1, power=5000.0, energy=11.0)) == []
+
+
+def test_stuck_sensor_is_flagged_once():
+    monitor = QualityMonitor(warmup=1000, stuck_run=5)
+    events = [monitor.check(reading(second, energy=10.0 + second)) for second in range(8)]
+    # Every gauge repeated its value for the fifth time
+    assert [len(e) for e in events] == [0, 0, 0, 0, 5, 0, 0, 0]
+    assert {event["kind"] for event in events[4]} == {"stuck"}
+
+
+def test_energy_counter_reset_is_flagged():
+    monitor = QualityMonitor()
+    monitor.check(reading(0, energy=500.0))
+    assert kinds(monitor.check(reading(1, energy=3.0))) == [("energy_reset", "energy", "flag")]
+
+
+def test_out_of_order_timestamp_is_flagged():
+    monitor = QualityMonitor()
+    monitor.check(reading(10))
+    assert kinds(monitor.check(reading(5, energy=11.0))) == [("out_of_order", None, "flag")]
+
+
+def test_devices_are_checked_independently():
+    monitor = QualityMonitor(warmup=10)
+    warm(monitor, "d1")
+    assert monitor.check(reading(0, "d2", power=5000.0)) == []
+
+
+def test_reused_slot_starts_fresh():
+    monitor = QualityMonitor(max_devices=1, warmup=10)
+    warm(monitor, "d1")
+    # d2 takes d1's row: no spike against d1's statistics, no out_of_order
+    # against d1's last timestamp
+    assert monitor.check(reading(0, "d2", power=5000.0)) == []
+    assert monitor.stats()["devices"] == 1
+
+
+def test_events_since_pages_in_order():
+    monitor = QualityMonitor()
+    for second in range(5):
+        monitor.check(reading(second, humidity=140.0))
+    events, last = monitor.events_since(0, limit=2)
+    assert [event["seq"] for event in events] == [1, 2] and last == 2
+    events, last = monitor.events_since(last, limit=10)
+    assert [event["seq"] for event in events] == [3, 4, 5] and last == 5
+    assert monitor.events_since(last) == ([], 5)
+
+
+def test_events_since_filters_by_device():
+    monitor = QualityMonitor()
+    monitor.check(reading(0, "d1", humidity=140.0))
+    monitor.check(reading(0, "d2", humidity=140.0))
+    events, _ = monitor.events_since(0, device_id="d2")
+    assert [event["device_id"] for event in events] == ["d2"]
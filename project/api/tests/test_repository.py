@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import Base
+from models import DeviceReading, Prediction
+from repository import Repository, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, id)) == (created_at, id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm8gc2VwYXJhdG9y", encode_cursor(datetime(2024, 1, 1), "x")])
+def test_decode_cursor_rejects_malformed_input(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+def predictions(user_id, count):
+    start = datetime(2024, 1, 1)
+    # Pairs share a created_at so the id breaks ties
+    return [
+        {"id": uuid.uuid4(), "user_id": user_id, "consumption": float(i), "created_at": start + timedelta(hours=i // 2)}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.anyio
+async def test_prediction_page_walks_history_newest_first(session):
+    user_id, other = uuid.uuid4(), uuid.uuid4()
+    rows = predictions(user_id, 7) + predictions(other, 3)
+    await session.execute(insert(Prediction), rows)
+    repository = Repository(session)
+
+    seen, after = [], None
+    while True:
+        items, next_cursor = await repository.prediction_page(user_id, 3, after)
+        seen += items
+        if next_cursor is None:
+            break
+        after = decode_cursor(next_cursor)
+    expected = sorted(rows[:7], key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    assert [item["id"] for item in seen] == [str(row["id"]) for row in expected]
+
+
+@pytest.mark.anyio
+async def test_add_readings_inserts_every_row(session):
+    rows = [{"device_id": "d1", "power": float(i), "timestamp": f"2024-01-01T00:00:0{i}Z"} for i in range(5)]
+    await Repository(session).add_readings(rows)
+    await Repository(session).add_readings([])
+    assert (await session.execute(select(func.count()).select_from(DeviceReading))).scalar() == 5
@@ -0,0 +1,51 @@
+import time
+
+import httpx
+import pytest
+
+import main
+import startup
+from benchmark import FakeSupabase
+
+pytestmark = pytest.mark.anyio
+
+PAYLOAD = {"appliances": {"tvs": 1}, "start_date": "2024-01-01", "end_date": "2024-01-30"}
+
+
+@pytest.fixture
+def report(monkeypatch):
+    report = startup.StartupReport()
+    monkeypatch.setattr(startup, "report", report)
+    monkeypatch.setattr(main, "report", report)
+    monkeypatch.setattr(main, "supabase", None)
+    monkeypatch.setattr(main, "create_supabase", FakeSupabase)
+    return report
+
+
+async def post_predict():
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            ready = await client.get("/ready")
+            return ready, await client.post("/predict", json=PAYLOAD)
+
+
+async def test_failed_warmup_answers_503(report, monkeypatch):
+    def fail():
+        raise RuntimeError("no models")
+
+    monkeypatch.setattr(startup, "load_models", fail)
+    ready, response = await post_predict()
+    assert ready.status_code == 503
+    assert response.status_code == 503
+    assert "no models" in response.json()["detail"]
+    assert response.headers["retry-after"]
+
+
+async def test_warmup_wait_is_capped(report, monkeypatch):
+    monkeypatch.setattr(startup, "load_models", lambda: time.sleep(1))
+    monkeypatch.setattr(main, "FORECAST_TIMEOUT", 0.1)
+    ready, response = await post_predict()
+    assert ready.status_code == 503
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Still warming up"